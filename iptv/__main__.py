@@ -2,18 +2,23 @@ import locale
 import os
 import sys
 
-from PyQt6.QtWidgets import QApplication
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 
-from iptv.models.channel_manager import ChannelManager
-from iptv.models.database.channel import Channel
-from iptv.views.main_window import MainWindow
 
-os.environ["LC_NUMERIC"] = "C"
-locale.setlocale(locale.LC_NUMERIC, 'C')
-sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+def run_gui():
+    """ Starts the graphical interface. """
+    # Qt and mpv are only imported here, the command line interface never loads them
+    from PyQt6.QtWidgets import QApplication
 
+    from iptv.config.settings import get_tuning_budget
+    from iptv.controllers.thread.tuning_scheduler import TuningSchedulerThread
+    from iptv.models.channel_manager import ChannelManager
+    from iptv.models.database.channel import Channel
+    from iptv.views.main_window import MainWindow
+
+    os.environ["LC_NUMERIC"] = "C"
+    locale.setlocale(locale.LC_NUMERIC, 'C')
 
-def main():
     # Create the database
     Channel.create_table()
 
@@ -27,9 +32,25 @@ def main():
     window = MainWindow()
     window.show()
 
+    # Keep the tuned status of the channels fresh in the background
+    budget = get_tuning_budget()
+    if budget:
+        tuning_scheduler = TuningSchedulerThread(budget)
+        app.aboutToQuit.connect(tuning_scheduler.stop)
+        tuning_scheduler.start()
+
     # Run the application's event loop
     sys.exit(app.exec())
 
 
+def main():
+    # With a command (import, tune, export, stats) run headless, otherwise start the interface
+    if len(sys.argv) > 1:
+        from iptv.cli import main as cli_main
+        sys.exit(cli_main(sys.argv[1:]))
+
+    run_gui()
+
+
 if __name__ == "__main__":
     main()
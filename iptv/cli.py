@@ -0,0 +1,224 @@
+"""
+Command line interface, for headless use (e.g. from cron):
+
+    python -m iptv import playlist.m3u https://provider.example/list.m3u8
+    python -m iptv tune
+    python -m iptv tune --schedule
+    python -m iptv export --output tuned.m3u
+    python -m iptv stats
+
+Only the model and controller layers are used: neither Qt nor mpv is ever imported. The modules of
+each command are imported when the command runs, so the interface starts quickly.
+"""
+import argparse
+import sys
+import time
+
+# Exit codes
+EXIT_OK = 0
+EXIT_ERROR = 1
+
+
+def _is_url(location):
+    """ Whether a playlist location is a URL rather than a local path. """
+    return location.lower().startswith(("http://", "https://"))
+
+
+def _print_progress(progress):
+    """ Progress callback printing the percentage on a single line of the terminal. """
+    if sys.stderr.isatty():
+        print(f"\r{progress:3d}%", end="", file=sys.stderr, flush=True)
+
+
+def _end_progress():
+    """ Ends the line of the progress percentage. """
+    if sys.stderr.isatty():
+        print(file=sys.stderr)
+
+
+def command_import(args):
+    """ Imports one or several playlists (files or URLs). """
+    from iptv.controllers.import_pipeline import FileSource, ImportPipeline, MultiSourceImport, URLSource
+
+    sources = [
+        URLSource(location, use_cache=not args.no_cache) if _is_url(location) else FileSource(location)
+        for location in args.sources
+    ]
+    mode = "resync" if args.resync else "append"
+
+    if len(sources) == 1:
+        result = ImportPipeline(
+            sources[0], mode=mode, progress_callback=_print_progress, resume=not args.restart
+        ).run()
+        _end_progress()
+        results = [dict(result, location=sources[0].location, error=None)]
+    else:
+        summary = MultiSourceImport(sources, mode=mode, progress_callback=_print_progress, max_workers=args.jobs).run()
+        _end_progress()
+        results = summary["sources"]
+
+    count_keys = ("inserted", "updated", "deleted") if mode == "resync" else ("inserted", "skipped")
+    failed = False
+    for result in results:
+        if result["error"]:
+            failed = True
+            print(f"{result['location']}: error: {result['error']}")
+        elif result["unchanged"]:
+            print(f"{result['location']}: unchanged since the last import")
+        else:
+            counts = ", ".join(f"{result[key]} {key}" for key in count_keys + ("duplicates", "filtered"))
+            print(f"{result['location']}: {counts}")
+
+    return EXIT_ERROR if failed else EXIT_OK
+
+
+def command_tune(args):
+    """ Probes the channels and updates their 'tuned' status. """
+    from iptv.controllers.tuning import tune_channels
+    from iptv.models.database.channel import Channel
+
+    if args.schedule:
+        return _run_tuning_scheduler(args.budget)
+
+    start = time.perf_counter()
+    processed = tune_channels(progress_callback=_print_progress)
+    _end_progress()
+
+    print(
+        f"Tuned {processed} channels in {time.perf_counter() - start:.1f}s: "
+        f"{Channel.count_channels(tuned=True)} working, {Channel.count_channels(tuned=False)} not working"
+    )
+    return EXIT_OK
+
+
+def _run_tuning_scheduler(budget):
+    """ Runs the background tuning until interrupted (Ctrl+C). """
+    import threading
+
+    from iptv.config.settings import get_tuning_budget
+    from iptv.controllers.tuning_scheduler import TuningScheduler
+
+    budget = budget if budget is not None else get_tuning_budget()
+    if budget <= 0:
+        print("The tuning budget is 0, nothing to schedule", file=sys.stderr)
+        return EXIT_ERROR
+
+    stop_event = threading.Event()
+    try:
+        TuningScheduler(budget).run(stop_event)
+    except KeyboardInterrupt:
+        stop_event.set()
+    return EXIT_OK
+
+
+def command_export(args):
+    """ Writes the channels to an M3U playlist. """
+    from iptv.controllers.m3u_writer import write_playlist
+    from iptv.models.database.channel import Channel
+
+    channels = Channel.iter_channels(tuned=None if args.all else True)
+
+    if args.output == "-":
+        count = write_playlist(channels, sys.stdout)
+    else:
+        with open(args.output, "w", encoding="utf-8") as file:
+            count = write_playlist(channels, file)
+        print(f"Exported {count} channels to {args.output}")
+
+    return EXIT_OK
+
+
+def command_stats(args):
+    """ Prints a summary of the database. """
+    from iptv.models.database.channel import Channel
+    from iptv.models.database.probe_history import ProbeHistory
+    from iptv.models.database.source import Source
+
+    def format_time(timestamp):
+        return time.strftime("%Y-%m-%d %H:%M", time.localtime(timestamp)) if timestamp else "never"
+
+    print(f"Channels: {Channel.count_channels()} ({Channel.count_channels(tuned=True)} tuned)")
+
+    health = ProbeHistory.get_summary()
+    if health["probed"]:
+        print(
+            f"Health: {health['healthy']} of {health['probed']} probed channels healthy, "
+            f"average score {health['health_score']:.2f}, median latency {health['latency_p50'] or 0:.0f} ms, "
+            f"last probe {format_time(health['last_probe_at'])}"
+        )
+        if health["dns_ms"] is not None:
+            print(
+                f"Latency breakdown: {health['dns_ms']:.1f} ms resolving hosts and "
+                f"{health['connect_ms']:.1f} ms opening connections per successful probe on average"
+            )
+
+    sources = Source.get_all_sources()
+    if sources:
+        print("Sources:")
+        for source in sources:
+            print(f"  {source.url}: {source.channel_count} channels, synced {format_time(source.last_synced_at)}")
+
+    groups = sorted(Channel.get_groups(), key=lambda group: group[1], reverse=True)
+    if groups:
+        print(f"Groups: {len(groups)}")
+        for group_title, count in groups[:args.groups]:
+            print(f"  {group_title or '(no group)'}: {count}")
+
+    return EXIT_OK
+
+
+def build_parser():
+    """ Builds the argument parser of the command line interface. """
+    parser = argparse.ArgumentParser(prog="python -m iptv", description="NeoIPTV command line interface.")
+    parser.add_argument("--database", help="Database to use (overrides NEO_IPTV_DATABASE and the configuration file).")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="Import playlists (files or URLs).")
+    import_parser.add_argument("sources", nargs="+", help="Paths or URLs of the playlists.")
+    import_parser.add_argument(
+        "--resync", action="store_true",
+        help="Synchronize the channels of each playlist (remove the channels gone from it) instead of appending."
+    )
+    import_parser.add_argument("--no-cache", action="store_true", help="Download the URLs even if unchanged.")
+    import_parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint of an interrupted import.")
+    import_parser.add_argument("--jobs", type=int, help="Worker processes when importing several playlists.")
+    import_parser.set_defaults(handler=command_import)
+
+    tune_parser = commands.add_parser("tune", help="Check which channels work.")
+    tune_parser.add_argument(
+        "--schedule", action="store_true",
+        help="Keep running, probing the channels that need it the most within a budget per minute."
+    )
+    tune_parser.add_argument("--budget", type=int, help="Channels probed per minute with --schedule.")
+    tune_parser.set_defaults(handler=command_tune)
+
+    export_parser = commands.add_parser("export", help="Export the channels to an M3U playlist.")
+    export_parser.add_argument("--output", "-o", default="-", help="File to write ('-' for the standard output).")
+    export_parser.add_argument("--all", action="store_true", help="Export every channel, not only the tuned ones.")
+    export_parser.set_defaults(handler=command_export)
+
+    stats_parser = commands.add_parser("stats", help="Print a summary of the database.")
+    stats_parser.add_argument("--groups", type=int, default=10, help="Number of groups listed (largest first).")
+    stats_parser.set_defaults(handler=command_stats)
+
+    return parser
+
+
+def main(argv=None):
+    """ Runs a command, returning the exit code. """
+    args = build_parser().parse_args(argv)
+
+    from iptv.config.settings import set_database_path
+    from iptv.models.database.channel import Channel
+
+    if args.database:
+        set_database_path(args.database)
+    Channel.create_table()
+
+    try:
+        return args.handler(args)
+    except KeyboardInterrupt:
+        return EXIT_ERROR
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return EXIT_ERROR
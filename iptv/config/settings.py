@@ -0,0 +1,135 @@
+import configparser
+import os
+
+from iptv.config.logger import logger
+
+# Environment variables overriding the configuration file
+CONFIG_FILE_ENV = "NEO_IPTV_CONFIG"
+DATABASE_PATH_ENV = "NEO_IPTV_DATABASE"
+CACHE_DIR_ENV = "NEO_IPTV_CACHE"
+
+# Default locations
+DEFAULT_CONFIG_FILE = os.path.join(
+    os.environ.get("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser("~"), ".config"),
+    "neo-iptv",
+    "config.ini"
+)
+DEFAULT_DATABASE_PATH = "iptv.db"
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "neo-iptv"
+)
+DEFAULT_TUNING_BUDGET = 60
+
+# Database path set through set_database_path(), it takes precedence over everything else
+_database_path = None
+
+
+def get_config_file():
+    """ Returns the path of the configuration file. """
+    return os.environ.get(CONFIG_FILE_ENV) or DEFAULT_CONFIG_FILE
+
+
+def load_config():
+    """
+    Reads the configuration file, e.g.:
+
+        [database]
+        path = ~/.local/share/neo-iptv/iptv.db
+
+        [cache]
+        dir = ~/.cache/neo-iptv
+
+        [tuning]
+        budget_per_minute = 60
+
+    A missing file results in an empty configuration.
+    """
+    config = configparser.ConfigParser()
+    config_file = get_config_file()
+    try:
+        config.read(config_file, encoding="utf-8")
+    except configparser.Error as e:
+        logger.error(f"Error while reading the configuration file '{config_file}': {e}")
+    return config
+
+
+def _resolve_path(path, base_dir=None):
+    """ Expands '~' and environment variables, leaving in-memory databases and URIs untouched. """
+    if path == ":memory:" or path.startswith("file:"):
+        return path
+
+    path = os.path.expandvars(os.path.expanduser(path))
+    if base_dir and not os.path.isabs(path):
+        path = os.path.join(base_dir, path)
+    return path
+
+
+def get_database_path():
+    """
+    Returns the database location, looked up in this order:
+    1. The path set with set_database_path().
+    2. The NEO_IPTV_DATABASE environment variable.
+    3. The 'path' option of the [database] section of the configuration file
+       (relative paths are relative to the configuration file).
+    4. 'iptv.db' in the working directory.
+
+    Besides a file path, ':memory:' and SQLite URIs such as 'file::memory:?cache=shared' are accepted.
+    """
+    global _database_path
+
+    if _database_path is None:
+        env_path = os.environ.get(DATABASE_PATH_ENV)
+        config_path = load_config().get("database", "path", fallback=None)
+
+        if env_path:
+            _database_path = _resolve_path(env_path)
+        elif config_path:
+            _database_path = _resolve_path(config_path, os.path.dirname(get_config_file()))
+        else:
+            _database_path = DEFAULT_DATABASE_PATH
+
+        logger.info(f"Using the database at '{_database_path}'")
+
+    return _database_path
+
+
+def set_database_path(path):
+    """
+    Sets the database location for the rest of the process, overriding the environment and
+    the configuration file. Call Channel.create_table() afterwards to create or upgrade the schema.
+    Passing None goes back to the environment/configuration lookup.
+    """
+    global _database_path
+    _database_path = _resolve_path(path) if path is not None else None
+
+
+def get_cache_dir():
+    """
+    Returns the directory of the on-disk caches (downloaded playlists metadata), looked up in this order:
+    1. The NEO_IPTV_CACHE environment variable.
+    2. The 'dir' option of the [cache] section of the configuration file
+       (relative paths are relative to the configuration file).
+    3. '~/.cache/neo-iptv' (or '$XDG_CACHE_HOME/neo-iptv').
+    """
+    env_dir = os.environ.get(CACHE_DIR_ENV)
+    if env_dir:
+        return _resolve_path(env_dir)
+
+    config_dir = load_config().get("cache", "dir", fallback=None)
+    if config_dir:
+        return _resolve_path(config_dir, os.path.dirname(get_config_file()))
+
+    return DEFAULT_CACHE_DIR
+
+
+def get_tuning_budget():
+    """
+    Returns the number of channels probed per minute by the background tuning, the 'budget_per_minute'
+    option of the [tuning] section of the configuration file (60 by default, 0 disables it).
+    """
+    try:
+        return max(0, load_config().getint("tuning", "budget_per_minute", fallback=DEFAULT_TUNING_BUDGET))
+    except ValueError as e:
+        logger.error(f"Invalid background tuning budget in the configuration file: {e}")
+        return DEFAULT_TUNING_BUDGET
@@ -0,0 +1,142 @@
+import asyncio
+import ipaddress
+import socket
+import threading
+import time
+
+from aiohttp.abc import AbstractResolver
+from aiohttp.resolver import DefaultResolver
+
+from iptv.config.logger import logger
+
+# Seconds the addresses of a host are reused. The system resolver (getaddrinfo) doesn't expose the
+# TTL of the records, so this caps it: short enough to follow providers moving their streams around
+DNS_TTL = 300
+# Seconds a failed resolution is reused, so the channels of a host that doesn't exist fail at once
+NEGATIVE_DNS_TTL = 30
+# Maximum number of cached hosts, the oldest entries are dropped first
+MAX_HOSTS = 10000
+
+
+def _is_ip_address(host):
+    """ Whether a host is an IP address literal, which is never resolved. """
+    try:
+        ipaddress.ip_address(host.strip("[]"))
+        return True
+    except ValueError:
+        return False
+
+
+class DNSCache:
+    """
+    Process-wide cache of the resolved addresses of the hosts of the channels, shared by the event
+    loops of the consecutive sweeps and of the background tuning. Thread-safe.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, ttl=DNS_TTL, negative_ttl=NEGATIVE_DNS_TTL, max_hosts=MAX_HOSTS):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_hosts = max_hosts
+        self._entries = {}  # (host, family) -> (expires_at, addresses, error), the oldest first
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls):
+        """ Get the singleton instance of the DNSCache """
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = DNSCache()
+            return cls._instance
+
+    def get(self, key):
+        """
+        Returns the cached resolution of a (host, family) key as an (addresses, error) tuple,
+        or None if it isn't cached or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() >= entry[0]:
+                del self._entries[key]
+                return None
+            return entry[1], entry[2]
+
+    def put(self, key, addresses=None, error=None):
+        """ Caches the addresses of a (host, family) key, or the error resolving it. """
+        expires_at = time.monotonic() + (self.ttl if error is None else self.negative_ttl)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (expires_at, addresses, error)
+            while len(self._entries) > self.max_hosts:
+                del self._entries[next(iter(self._entries))]
+
+    def clear(self):
+        """ Forgets every cached resolution. """
+        with self._lock:
+            self._entries.clear()
+
+
+class CachingResolver(AbstractResolver):
+    """
+    aiohttp resolver answering from the DNSCache, resolving each host only once (concurrent lookups of
+    the same host share the same resolution) with aiohttp's default resolver.
+
+    prefetch() resolves a host in the background ahead of its first connection, so the probes find its
+    addresses ready. Must be created in the event loop it is used from.
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache or DNSCache.get_instance()
+        self._resolver = DefaultResolver()
+        self._lookups = {}  # (host, family) -> Task of the resolution in progress
+
+    async def _lookup(self, key):
+        """ Resolves a (host, family) key and caches the outcome. """
+        host, family = key
+        try:
+            addresses = await self._resolver.resolve(host, 0, family)
+        except OSError as e:
+            self.cache.put(key, error=e)
+            raise
+        self.cache.put(key, addresses)
+        return addresses
+
+    def _start_lookup(self, key):
+        """ Returns the resolution in progress for a key, starting it if needed. """
+        task = self._lookups.get(key)
+        if task is None:
+            task = self._lookups[key] = asyncio.ensure_future(self._lookup(key))
+            task.add_done_callback(lambda _: self._lookups.pop(key, None))
+        return task
+
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        key = (host, family)
+        cached = self.cache.get(key)
+        if cached is None:
+            # Shielded: a cancelled connection doesn't cancel the resolution other probes wait for
+            addresses = await asyncio.shield(self._start_lookup(key))
+        else:
+            addresses, error = cached
+            if error is not None:
+                raise OSError(error.errno, error.strerror or str(error))
+
+        return [dict(address, port=port) for address in addresses]
+
+    def prefetch(self, host, family=socket.AF_UNSPEC):
+        """ Starts resolving a host in the background, unless it is an IP address or already resolved. """
+        if not host or _is_ip_address(host) or self.cache.get((host, family)) is not None:
+            return
+
+        def log_failure(task):
+            if not task.cancelled() and task.exception() is not None:
+                logger.debug(f"Error resolving '{host}': {task.exception()}")
+
+        self._start_lookup((host, family)).add_done_callback(log_failure)
+
+    async def close(self):
+        for task in list(self._lookups.values()):
+            task.cancel()
+        await self._resolver.close()
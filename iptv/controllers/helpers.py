@@ -1,12 +1,5 @@
-import asyncio
-import random
-import time
-from concurrent.futures import ThreadPoolExecutor
-
-import aiohttp
-import requests
-
-from iptv.config.logger import logger
+from iptv.controllers.probe_cache import ProbeCache
+from iptv.controllers.stream_probe import PROBE_TIMEOUT, probe_stream, probe_stream_sync
 from iptv.models.database.channel import Channel
 
 
@@ -19,100 +12,93 @@ def process_channel_entry(entry_data):
     if not required_fields.issubset(entry_data.keys()):
         return "Error: Missing required fields in entry data."
 
-    # Check for duplicate channels by URL
-    if Channel.get_channel_by_url(entry_data["url"]):
-        return False
-
-    Channel.insert_channel(entry_data)
-    return True
+    # Duplicated URLs are ignored by the database
+    inserted, _ = Channel.insert_channels_bulk([entry_data])
+    return inserted == 1
 
 
-def is_url_responsive(channel, timeout=5):
+def request_probe(url, timeout=PROBE_TIMEOUT):
     """
-    Checks if a channel's URL is responsive within the specified timeout period.
+    Probes a stream URL, reading only its first bytes (see stream_probe).
+    Always sends the requests: probe_url() should be used instead, which goes through the probe cache.
 
-    :param channel: The channel object that contains the URL to test.
-    :param timeout: Timeout in seconds for the HTTP request (default is 5 seconds).
-    :return: True if the URL is responsive (status code 200), False otherwise.
+    :param url: The URL to test.
+    :param timeout: Timeout in seconds of the probe (default is 5 seconds).
+    :return: A ProbeResult; 'ok' is True if the stream is served, 'status' is None if no response arrived.
     """
-    try:
-        # Perform a HEAD request to check the URL without downloading the content
-        response = requests.head(channel.url, timeout=timeout)
+    return probe_stream_sync(url, timeout)
 
-        # Check if the response code indicates success (200)
-        return response.status_code == 200
 
-    except requests.RequestException as e:
-        # If there's any exception (timeout, connection error, etc.), the channel is considered offline
-        logger.error(f"Error checking channel '{getattr(channel, 'name', 'Unknown')}': {e}")
-        return False
-
-
-def filter_responsive_channels(channels):
+def probe_url(url, timeout=PROBE_TIMEOUT):
     """
-    Filters out non-responsive channels by checking their URLs in parallel,
-    and updates the 'tuned' status of non-responsive channels.
+    Probes a URL, reusing the result of a recent probe of the same URL (see ProbeCache).
 
-    :param channels: List of channels.
-    :return: List of responsive channels.
+    :param url: The URL to test.
+    :param timeout: Timeout in seconds of the probe (default is 5 seconds).
+    :return: A ProbeResult.
     """
+    return ProbeCache.get_instance().probe(url, lambda: request_probe(url, timeout)).result
 
-    # Limiting the max number of threads to 100
-    batch_size = 100
-    max_workers = min(batch_size, len(channels))
-
-    # Process channels in batches of 100
-    for i in range(0, len(channels), batch_size):
-        batch = channels[i:i + batch_size]
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            results = list(executor.map(check_channel, batch))
-
-    return [channel for channel in results if channel is not None]
 
-
-def check_channel(channel):
+def is_url_responsive(channel, timeout=PROBE_TIMEOUT):
     """
-    Checks if a channel is responsive and updates its 'tuned' status.
+    Checks if a channel's URL is responsive within the specified timeout period.
 
-    :param channel: The channel to test.
-    :return: The channel if responsive, None if not.
+    :param channel: The channel object that contains the URL to test.
+    :param timeout: Timeout in seconds of the probe (default is 5 seconds).
+    :return: True if the stream is served, False otherwise.
     """
-    Channel.update_channel(channel.id, {"tuned": is_url_responsive(channel)})
+    return probe_url(channel.url, timeout).ok
 
-    if not is_url_responsive(channel):
-        return None
 
-    # Introduce a small delay between requests
-    time.sleep(random.uniform(0.1, 0.5))
+async def request_probe_async(url, session, timeout=None):
+    """
+    Asynchronous version of request_probe(), sharing the connections of an aiohttp session.
+    Always sends the requests: probe_url_async() should be used instead, which goes through the probe cache.
 
-    return channel
+    :param url: The URL to test.
+    :param session: The aiohttp session to make the HTTP requests (its timeout applies to each request).
+    :param timeout: Optional timeout in seconds of the whole probe.
+    :return: A ProbeResult; 'ok' is True if the stream is served, 'status' is None if no response arrived.
+    """
+    return await probe_stream(url, session, timeout)
 
 
-async def check_channel_async(channel, session):
+async def probe_url_async(url, session, timeout=None):
     """
-    Asynchronously checks if a channel is responsive and updates its 'tuned' status.
+    Asynchronous version of probe_url(), sharing the connections of an aiohttp session.
 
-    :param channel: The channel to test.
-    :param session: The aiohttp session to make the HTTP request.
-    :return: None
+    :param url: The URL to test.
+    :param session: The aiohttp session to make the HTTP requests (its timeout applies to each request).
+    :param timeout: Optional timeout in seconds of the whole probe.
+    :return: A ProbeResult.
     """
-    async with session.get(channel.url) as response:
-        if response.status != 200:
-            Channel.update_channel(channel.id, {"tuned": False})
-        else:
-            Channel.update_channel(channel.id, {"tuned": True})
+    cached = await ProbeCache.get_instance().probe_async(url, lambda: request_probe_async(url, session, timeout))
+    return cached.result
 
 
 async def filter_responsive_channels_async(channels):
     """
-    Filters out non-responsive channels asynchronously by checking their URLs in parallel,
-    and updates the 'tuned' status of non-responsive channels.
+    Filters out non-responsive channels asynchronously by checking their URLs concurrently,
+    and updates the 'tuned' status of the channels.
 
-    :param channels: List of channels.
-    :return: None
+    :param channels: Iterable of channels.
+    :return: List of responsive channels.
     """
-    async with aiohttp.ClientSession() as session:
-        tasks = []
-        for channel in channels:
-            tasks.append(check_channel_async(channel, session))
-        await asyncio.gather(*tasks)
+    # Imported here: the tuning engine is built on the probes of this module
+    from iptv.controllers.tuned_status_writer import TunedStatusWriter
+    from iptv.controllers.tuning import TuningEngine
+
+    responsive = []
+    with TunedStatusWriter(background=True) as writer:
+        def on_result(channel, result, checked_at):
+            writer.add(channel.id, result, checked_at)
+            if result.ok:
+                responsive.append(channel)
+
+        def on_skipped(channel):
+            writer.add_unreachable(channel.id)
+
+        await TuningEngine().run(channels, on_result, on_skipped)
+
+    return responsive
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import time
+
+from iptv.config.logger import logger
+
+# Probes per second sent to a single host, and how many can be sent at once after a quiet period
+HOST_RATE = 20
+HOST_BURST = 20
+# Probes in a row failing to connect to a host before its circuit opens
+FAILURE_THRESHOLD = 5
+# Seconds a host is left alone once its circuit opens, doubled each time a trial probe fails
+COOLDOWN = 60
+MAX_COOLDOWN = 600
+
+
+class HostState:
+    __slots__ = ("tokens", "refilled_at", "failures", "open_until", "cooldown", "trial_in_flight")
+
+    def __init__(self, tokens, cooldown):
+        """
+        Protection state of a host:
+        - tokens / refilled_at: Token bucket limiting the probe rate.
+        - failures (int): Probes in a row that couldn't connect to the host.
+        - open_until (float): Monotonic time until which the circuit is open (None while closed).
+        - trial_in_flight (bool): Whether the single probe allowed after the cooldown is running.
+        """
+        self.tokens = tokens
+        self.refilled_at = time.monotonic()
+        self.failures = 0
+        self.open_until = None
+        self.cooldown = cooldown
+        self.trial_in_flight = False
+
+
+class HostGuard:
+    """
+    Protects the hosts of the channels during the tuning:
+    - a token bucket per host limits the probes sent to it per second,
+    - a circuit breaker per host stops probing a host after FAILURE_THRESHOLD probes in a row couldn't
+      connect to it (DNS failure, connection refused or timed out): the tuning skips its channels and marks
+      them as not working at once, instead of each waiting for the timeout (their results are not cached,
+      so the player still tries them). Streams that hang once connected don't count, the
+      host is up. After the cooldown a single trial probe is let through, closing the circuit if the host
+      accepts the connection and opening it again for twice as long otherwise.
+
+    Process-wide and thread-safe, so consecutive sweeps and the background tuning share what they learnt.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, rate=HOST_RATE, burst=HOST_BURST, failure_threshold=FAILURE_THRESHOLD,
+                 cooldown=COOLDOWN, max_cooldown=MAX_COOLDOWN):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls):
+        """ Get the singleton instance of the HostGuard """
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = HostGuard()
+            return cls._instance
+
+    def _state(self, host):
+        """ Protection state of a host. Must be called holding the lock. """
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = HostState(self.burst, self.cooldown)
+        return state
+
+    def is_open(self, host):
+        """ Whether the probes of a host are currently rejected. """
+        with self._lock:
+            state = self._hosts.get(host)
+            return state is not None and state.open_until is not None
+
+    def allow(self, host):
+        """
+        Whether a host can be probed. Once its cooldown is over, only one caller is allowed (the trial
+        probe) until record() is called with its outcome.
+        """
+        with self._lock:
+            state = self._state(host)
+            if state.open_until is None:
+                return True
+            if state.trial_in_flight or time.monotonic() < state.open_until:
+                return False
+            state.trial_in_flight = True
+            return True
+
+    def reserve(self, host):
+        """ Takes a token of the bucket of a host, returning how many seconds to wait before probing it. """
+        with self._lock:
+            state = self._state(host)
+            now = time.monotonic()
+            state.tokens = min(self.burst, state.tokens + (now - state.refilled_at) * self.rate)
+            state.refilled_at = now
+            # Tokens go negative when reserved ahead, so the waiting callers are spaced by 1 / rate
+            state.tokens -= 1
+            return -state.tokens / self.rate if state.tokens < 0 else 0.0
+
+    async def acquire(self, host):
+        """ Waits until the rate limit of a host allows another probe. """
+        delay = self.reserve(host)
+        if delay:
+            await asyncio.sleep(delay)
+
+    def record(self, host, reachable):
+        """
+        Records the outcome of a probe allowed by allow().
+        :param reachable: True if the probe connected to the host (whatever happened next), False if the host
+                          couldn't be resolved or connected to, None if the probe didn't complete (e.g. cancelled).
+        """
+        with self._lock:
+            state = self._state(host)
+            trial = state.trial_in_flight
+            state.trial_in_flight = False
+
+            if reachable is None:
+                return
+
+            if reachable:
+                if state.open_until is not None:
+                    logger.info(f"Host '{host}' answers again, resuming its probes")
+                state.failures = 0
+                state.open_until = None
+                state.cooldown = self.cooldown
+                return
+
+            state.failures += 1
+            if trial:
+                # The host is still down, leave it alone for longer
+                state.cooldown = min(state.cooldown * 2, self.max_cooldown)
+                state.open_until = time.monotonic() + state.cooldown
+            elif state.open_until is None and state.failures >= self.failure_threshold:
+                state.open_until = time.monotonic() + state.cooldown
+                logger.warning(
+                    f"Host '{host}' couldn't be connected to {state.failures} times in a row, "
+                    f"its channels are marked as not working without being probed for {state.cooldown}s"
+                )
@@ -0,0 +1,866 @@
+import bz2
+import gzip
+import hashlib
+import lzma
+import mmap
+import multiprocessing
+import os
+import queue
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
+
+import requests
+from urllib3.util.request import ACCEPT_ENCODING
+
+from iptv.config.logger import logger
+from iptv.config.settings import get_database_path
+from iptv.controllers.m3u_parser import CHUNK_SIZE, M3UParser, iter_buffer_lines, iter_file_chunks, iter_lines
+from iptv.controllers.playlist_cache import PlaylistCache, PlaylistCacheEntry
+from iptv.models.database.channel import INSERT_COLUMNS, Channel
+from iptv.models.database.connection import is_memory_database
+from iptv.models.database.import_checkpoint import ImportCheckpoint
+from iptv.models.database.source import Source, StagedResync
+
+# Maximum number of items waiting between two stages (batches of lines or entries)
+QUEUE_SIZE = 8
+
+# Number of entries per batch sent through the stages and written per transaction
+BATCH_SIZE = 1000
+
+# Number of lines per item sent from the fetch stage to the parse stage
+LINES_PER_ITEM = 2048
+
+# Compressed playlist formats, detected by their magic number, and the function opening them for reading
+COMPRESSIONS = (
+    (b"\x1f\x8b", gzip.open),
+    (b"\xfd7zXZ\x00", lzma.open),
+    (b"BZh", bz2.open),
+)
+
+# Marks the end of the stream in a stage queue
+_END = object()
+
+# How far a batch goes in its source: bytes and entries covered (up to the end of its last entry) and
+# the SHA-256 of those bytes. It is the checkpoint recorded once the batch is written.
+ImportPosition = namedtuple("ImportPosition", ["offset", "entry_index", "content_hash"])
+
+
+class ImportCancelled(Exception):
+    """ Raised inside the stages when the import is cancelled or another stage failed. """
+
+
+class SourceUnchanged(Exception):
+    """ Raised by a source whose content did not change since its last successful import. """
+
+
+class FileSource:
+    """
+    A playlist stored in a local file. Its imports can be resumed after an interruption.
+
+    Files compressed with gzip, xz or bzip2 (e.g. 'playlist.m3u.gz') are detected by their content and
+    decompressed on the fly. Uncompressed files are memory-mapped and split into lines in place, so the
+    text of the playlist is never held in memory as a whole, whatever the size of the file.
+    """
+
+    resumable = True
+
+    def __init__(self, file_path):
+        self.location = file_path
+        self.file_size = os.path.getsize(file_path)
+        self.open_decompressed = self._detect_compression()
+
+        # Size of the playlist text. For compressed files, it is extrapolated while reading them
+        # from the compression ratio seen so far.
+        self.total_bytes = None if self.open_decompressed else self.file_size
+
+    def _detect_compression(self):
+        """ Returns the function opening the file if it is compressed, or None. """
+        with open(self.location, "rb") as file:
+            magic = file.read(6)
+        for signature, open_function in COMPRESSIONS:
+            if magic.startswith(signature):
+                return open_function
+        return None
+
+    def iter_lines(self, start=0):
+        """ Reads the lines of the playlist, from the byte offset 'start' of its (decompressed) text. """
+        if self.open_decompressed or self.file_size == 0:
+            yield from iter_lines(self.iter_chunks(start))
+            return
+
+        with open(self.location, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            if buffer.find(b"\n", 0, CHUNK_SIZE) == -1 and buffer.find(b"\r", 0, CHUNK_SIZE) != -1:
+                # Old Mac line endings ('\r' only), only handled by the chunked reader
+                yield from iter_lines(self.iter_chunks(start))
+            else:
+                yield from iter_buffer_lines(buffer, start)
+
+    def iter_chunks(self, start=0):
+        """ Reads the (decompressed) playlist in chunks, from the byte offset 'start' of its text. """
+        with open(self.location, "rb") as raw_file:
+            if not self.open_decompressed:
+                raw_file.seek(start)
+                yield from iter_file_chunks(raw_file)
+                return
+
+            with self.open_decompressed(raw_file) as file:
+                # Compressed streams can't jump to an offset, skipping decompresses everything before it
+                file.seek(start)
+                produced = start
+                while chunk := file.read(CHUNK_SIZE):
+                    produced += len(chunk)
+                    compressed_read = raw_file.tell()
+                    if compressed_read:
+                        self.total_bytes = max(produced, int(self.file_size * produced / compressed_read))
+                    yield chunk
+                self.total_bytes = produced
+
+    def prefix_digest(self, length):
+        """ SHA-256 hash object fed with the first 'length' bytes of the playlist text (None if it is shorter). """
+        digest = hashlib.sha256()
+        remaining = length
+        for chunk in self.iter_chunks():
+            if remaining <= 0:
+                break
+            digest.update(chunk[:remaining])
+            remaining -= len(chunk)
+        return digest if remaining <= 0 else None
+
+    def commit(self):
+        """ Called once the playlist was imported successfully. """
+
+
+class URLSource:
+    """
+    A playlist downloaded over HTTP(S), streamed in chunks.
+
+    The body is requested compressed (gzip/deflate, plus brotli when the 'brotli' package is installed)
+    and decompressed on the fly. Downloads go through a PlaylistCache: the validators of the last
+    imported download (ETag/Last-Modified) make the request conditional, and when the server does not
+    send validators the body is spooled to a temporary file and compared with the hash of the last
+    import. Either way an unchanged playlist raises SourceUnchanged before anything is parsed.
+    """
+
+    resumable = False
+
+    # Kind of import the download is for, set by ImportPipeline: the cache entries of the different
+    # kinds of imports of a URL are kept apart (see import_cache_scope())
+    cache_scope = ""
+
+    def __init__(self, url, timeout=30, use_cache=True, cache=None):
+        """
+        :param use_cache: False to always download and import the playlist.
+        :param cache: The PlaylistCache to use, by default the one of the current database
+                      (there is no cache for in-memory databases, whose content doesn't outlive the process).
+        """
+        self.location = url
+        self.timeout = timeout
+        self.total_bytes = None  # Known once the response headers arrive (if the server sends it)
+
+        database_path = get_database_path()
+        if cache is None and use_cache and not is_memory_database(database_path):
+            cache = PlaylistCache(namespace=os.path.abspath(database_path))
+        self.cache = cache if use_cache else None
+
+        self._downloaded = None  # PlaylistCacheEntry of the current download, saved by commit()
+
+    def iter_lines(self):
+        """ Downloads the lines of the playlist. """
+        return iter_lines(self.iter_chunks())
+
+    def iter_chunks(self):
+        """ Downloads the playlist in chunks. """
+        cached = self.cache.get(self.location, self.cache_scope) if self.cache else None
+
+        headers = {"Accept-Encoding": ACCEPT_ENCODING}
+        if cached:
+            headers.update(cached.conditional_headers())
+
+        with requests.get(self.location, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code == 304:
+                raise SourceUnchanged(f"{self.location} was not modified since its last import")
+            response.raise_for_status()
+
+            downloaded = PlaylistCacheEntry(
+                self.location,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified")
+            )
+            digest = hashlib.sha256()
+
+            if cached and cached.sha256 and not downloaded.has_validators:
+                # The only way to know whether the playlist changed is to hash it all before parsing it
+                yield from self._iter_spooled(response, digest, cached.sha256)
+            else:
+                yield from self._iter_response(response, digest)
+
+            downloaded.sha256 = digest.hexdigest()
+            downloaded.size = self._size
+            self._downloaded = downloaded
+
+    def _iter_response(self, response, digest):
+        """ Streams the decompressed body, hashing it on the way. """
+        content_length = int(response.headers.get("Content-Length") or 0) or None
+        compressed = response.headers.get("Content-Encoding", "identity").lower() != "identity"
+        self.total_bytes = None if compressed else content_length
+
+        self._size = 0
+        for chunk in response.iter_content(CHUNK_SIZE):
+            digest.update(chunk)
+            self._size += len(chunk)
+
+            if compressed and content_length:
+                # Extrapolate the decompressed size from the compression ratio seen so far
+                raw_bytes = response.raw.tell()
+                if raw_bytes:
+                    self.total_bytes = int(content_length * self._size / raw_bytes)
+
+            yield chunk
+
+    def _iter_spooled(self, response, digest, cached_sha256):
+        """ Downloads the whole body to a temporary file, then streams it unless its hash is the cached one. """
+        with tempfile.TemporaryFile() as spool:
+            for chunk in self._iter_response(response, digest):
+                spool.write(chunk)
+
+            if digest.hexdigest() == cached_sha256:
+                raise SourceUnchanged(f"{self.location} has the same content as at its last import")
+
+            self.total_bytes = self._size
+            spool.seek(0)
+            yield from iter_file_chunks(spool)
+
+    def commit(self):
+        """ Called once the playlist was imported successfully: remember the download for the next one. """
+        if self.cache and self._downloaded:
+            self.cache.store(self._downloaded, self.cache_scope)
+
+
+def import_cache_scope(mode, entry_filter=None):
+    """
+    Scope of the PlaylistCache entries of an import: an unchanged playlist only skips imports of the same
+    kind, e.g. a resync still runs after an append import of the same URL, and an unfiltered import after
+    a filtered one.
+    """
+    return mode if entry_filter is None else f"{mode}:filtered"
+
+
+def _hash_lines(lines, digest):
+    """ Feeds the lines to a hash object as they are consumed. """
+    for line in lines:
+        digest.update(line)
+        yield line
+
+
+class StageStats:
+    """ Throughput of one stage of the import pipeline. """
+
+    __slots__ = ("name", "unit", "items", "elapsed_seconds", "waiting_seconds")
+
+    def __init__(self, name, unit="entries"):
+        self.name = name
+        self.unit = unit
+        self.items = 0  # Items produced by the stage
+        self.elapsed_seconds = 0.0  # Wall time of the stage
+        self.waiting_seconds = 0.0  # Time spent waiting on the neighbouring stages (backpressure)
+
+    @property
+    def busy_seconds(self):
+        """ Time the stage spent doing its own work. """
+        return max(0.0, self.elapsed_seconds - self.waiting_seconds)
+
+    @property
+    def rate(self):
+        """ Items processed per second of work. """
+        return self.items / self.busy_seconds if self.busy_seconds else 0.0
+
+    def __repr__(self):
+        return (
+            f"<StageStats({self.name}: {self.items} {self.unit} in {self.busy_seconds:.2f}s busy, "
+            f"{self.waiting_seconds:.2f}s waiting, {self.rate:.0f} {self.unit}/s)>"
+        )
+
+
+class ImportPipeline:
+    """
+    Imports a playlist through explicit stages, each one running in its own thread and
+    connected to the next by a bounded queue, so a slow stage holds back the faster ones
+    instead of letting data pile up in memory:
+
+        fetch -> parse -> normalize -> dedupe -> write
+
+    - fetch: reads the source (decompressing it if needed) and splits it into lines.
+    - parse: parses the lines into entries, in batches.
+    - normalize: drops the entries rejected by 'entry_filter' and builds the database rows.
+    - dedupe: drops the entries whose canonical URL (see canonical_url) was already seen during this
+      import, or in "append" mode is already stored (checked against a set loaded once per import).
+    - write: runs in the calling thread. In "append" mode the batches are inserted as they come;
+      in "resync" mode the channels of the source are synchronized with the playlist (see Source.resync).
+
+    Imports of files in "append" mode record an ImportCheckpoint in the transaction of every batch, so an
+    interrupted import (closed dialog, crash) carries on from the last written batch the next time the
+    same file is imported, as long as the part already imported was not modified in the meantime.
+    """
+
+    def __init__(self, source, mode="append", entry_filter=None, progress_callback=None, batch_size=BATCH_SIZE,
+                 resume=True):
+        """
+        :param source: A FileSource or URLSource.
+        :param mode: "append" or "resync".
+        :param entry_filter: Optional callable receiving each parsed entry, returning False to skip it.
+        :param progress_callback: Optional callable receiving the progress (0-100) after each written batch.
+        :param batch_size: Number of entries per batch.
+        :param resume: False to import the whole source even if an earlier import of it was interrupted.
+        """
+        if mode not in ("append", "resync"):
+            raise ValueError(f"Unknown import mode: {mode}")
+
+        self.source = source
+        self.mode = mode
+        self.entry_filter = entry_filter
+        self.progress_callback = progress_callback
+        self.batch_size = batch_size
+
+        if isinstance(source, URLSource):
+            source.cache_scope = import_cache_scope(mode, entry_filter)
+
+        self.stats = {
+            "fetch": StageStats("fetch", "bytes"),
+            "parse": StageStats("parse"),
+            "normalize": StageStats("normalize"),
+            "dedupe": StageStats("dedupe"),
+            "write": StageStats("write"),
+        }
+
+        self._cancelled = threading.Event()
+        self._error = None
+        self._offset = 0  # Bytes of the source covered by the batches written so far
+
+        # Checkpoints are only possible where the source can be read again from an offset, and where
+        # every batch is committed as it is written
+        self._checkpoints = mode == "append" and source.resumable
+        self._resume = resume and self._checkpoints
+        self._start = ImportPosition(0, 0, None)  # Where the parsing starts (the checkpoint when resuming)
+        self._start_digest = None  # SHA-256 hash object of the source bytes before the start offset
+        self._stored_urls = None  # Canonical URLs already in the database, loaded by run() in "append" mode
+        self._already_stored = 0  # Entries dropped by the dedupe stage because they are already stored
+
+    def cancel(self):
+        """ Stop the import as soon as possible (the batches already written are kept). """
+        self._cancelled.set()
+
+    def run(self):
+        """
+        Runs the import and blocks until it is finished.
+
+        :return: A dictionary with the counts of the write mode ('inserted' and 'skipped' for "append";
+                 'inserted', 'updated' and 'deleted' for "resync"), plus 'total' (entries written),
+                 'duplicates' (repeated URLs in the playlist), 'filtered' (entries rejected by the
+                 filter), 'unchanged' (True when the source didn't change since its last import, in
+                 which case nothing is parsed nor written), 'resumed_from' (entries skipped because an
+                 interrupted import already wrote them) and 'stats' (the StageStats of each stage).
+        """
+        self.counts = {"duplicates": 0, "filtered": 0}
+
+        if self._resume:
+            self._load_checkpoint()
+
+        if self.mode == "append":
+            # The channels already stored are dropped before reaching the writer
+            self._stored_urls = Channel.get_canonical_urls()
+
+        lines = queue.Queue(QUEUE_SIZE)
+        parsed = queue.Queue(QUEUE_SIZE)
+        normalized = queue.Queue(QUEUE_SIZE)
+        deduped = queue.Queue(QUEUE_SIZE)
+
+        threads = [
+            self._start_stage("fetch", self._fetch, None, lines),
+            self._start_stage("parse", self._parse, lines, parsed),
+            self._start_stage("normalize", self._normalize, parsed, normalized),
+            self._start_stage("dedupe", self._dedupe, normalized, deduped),
+        ]
+
+        write_stats = self.stats["write"]
+        result = None
+        start = time.perf_counter()
+        try:
+            result = self._write(self._receive(deduped, write_stats))
+        except ImportCancelled:
+            result = None
+        except Exception as e:
+            self._error = self._error or e
+        finally:
+            # Unblock the other stages if the writer stopped early
+            if self._error or result is None:
+                self._cancelled.set()
+            for thread in threads:
+                thread.join()
+            write_stats.elapsed_seconds = time.perf_counter() - start
+
+        if isinstance(self._error, SourceUnchanged):
+            # Nothing to parse nor to write
+            logger.info(f"Skipped the import of {self.source.location}: {self._error}")
+            if self.mode == "resync":
+                result = {"inserted": 0, "updated": 0, "deleted": 0, "total": 0}
+            else:
+                result = {"inserted": 0, "skipped": 0, "total": 0}
+            result.update(self.counts)
+            result["unchanged"] = True
+            result["resumed_from"] = 0
+            result["stats"] = list(self.stats.values())
+            return result
+        if self._error:
+            raise self._error
+        if result is None:
+            raise ImportCancelled("The import was cancelled.")
+        if not self.stats["parse"].items and not self._start.entry_index:
+            raise ValueError("The playlist is invalid or cannot be parsed.")
+
+        if self._checkpoints:
+            ImportCheckpoint.delete(self.source.location)
+        self.source.commit()
+
+        result.update(self.counts)
+        result["unchanged"] = False
+        result["resumed_from"] = self._start.entry_index
+        result["stats"] = list(self.stats.values())
+
+        for stats in self.stats.values():
+            logger.info(f"Import of {self.source.location} - {stats}")
+
+        return result
+
+    def _load_checkpoint(self):
+        """ Sets the start of the import to the checkpoint of an interrupted import of the source, if still valid. """
+        checkpoint = ImportCheckpoint.get(self.source.location)
+        if checkpoint is None:
+            return
+
+        digest = self.source.prefix_digest(checkpoint.byte_offset)
+        if digest is None or digest.hexdigest() != checkpoint.content_hash:
+            logger.info(f"{self.source.location} was modified since its import was interrupted, starting over")
+            ImportCheckpoint.delete(self.source.location)
+            return
+
+        self._start = ImportPosition(checkpoint.byte_offset, checkpoint.entry_index, checkpoint.content_hash)
+        self._start_digest = digest
+        self._offset = checkpoint.byte_offset
+        logger.info(
+            f"Resuming the import of {self.source.location} after entry {checkpoint.entry_index} "
+            f"(byte {checkpoint.byte_offset})"
+        )
+
+    # Stage plumbing
+
+    def _start_stage(self, name, work, inbox, outbox):
+        """ Runs 'work' in a thread, feeding it the items of 'inbox' and sending what it yields to 'outbox'. """
+        thread = threading.Thread(
+            target=self._run_stage,
+            args=(self.stats[name], work, inbox, outbox),
+            name=f"import-{name}",
+            daemon=True
+        )
+        thread.start()
+        return thread
+
+    def _run_stage(self, stats, work, inbox, outbox):
+        """ Body of a stage thread. """
+        start = time.perf_counter()
+        try:
+            items = work(self._receive(inbox, stats)) if inbox is not None else work()
+            for item in items:
+                self._send(outbox, item, stats)
+            self._send(outbox, _END, stats)
+        except ImportCancelled:
+            pass
+        except SourceUnchanged as e:
+            self._error = self._error or e
+            self._cancelled.set()
+        except Exception as e:
+            logger.error(f"Import stage '{stats.name}' failed: {e}")
+            self._error = self._error or e
+            self._cancelled.set()
+        finally:
+            stats.elapsed_seconds = time.perf_counter() - start
+
+    def _receive(self, inbox, stats):
+        """ Generator over the items of a queue until the end of the stream. """
+        while True:
+            start = time.perf_counter()
+            while True:
+                if self._cancelled.is_set():
+                    raise ImportCancelled()
+                try:
+                    item = inbox.get(timeout=0.1)
+                    break
+                except queue.Empty:
+                    continue
+            stats.waiting_seconds += time.perf_counter() - start
+
+            if item is _END:
+                return
+            yield item
+
+    def _send(self, outbox, item, stats):
+        """ Put an item in a queue, waiting while it is full. """
+        start = time.perf_counter()
+        while True:
+            if self._cancelled.is_set():
+                raise ImportCancelled()
+            try:
+                outbox.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        stats.waiting_seconds += time.perf_counter() - start
+
+    # Stages
+
+    def _fetch(self):
+        """ Stage 1: the lines of the source, LINES_PER_ITEM at a time. """
+        stats = self.stats["fetch"]
+        lines = self.source.iter_lines(self._start.offset) if self._start.offset else self.source.iter_lines()
+        while batch := list(islice(lines, LINES_PER_ITEM)):
+            stats.items += sum(map(len, batch))
+            yield batch
+
+    def _parse(self, line_batches):
+        """ Stage 2: batches of parsed entries, each with the ImportPosition reached after its last entry. """
+        stats = self.stats["parse"]
+        parser = M3UParser()
+        parser.bytes_read = self._start.offset
+        lines = chain.from_iterable(line_batches)
+
+        digest = None
+        if self._checkpoints:
+            # Hash the lines as the parser consumes them, the hash always covers 'parser.bytes_read' bytes
+            digest = self._start_digest.copy() if self._start_digest else hashlib.sha256()
+            lines = _hash_lines(lines, digest)
+
+        def position():
+            return ImportPosition(
+                parser.bytes_read,
+                self._start.entry_index + parser.entries_parsed,
+                digest.hexdigest() if digest else None
+            )
+
+        batch = []
+        for entry in parser.parse(lines):
+            batch.append(entry)
+            if len(batch) >= self.batch_size:
+                stats.items += len(batch)
+                yield batch, position()
+                batch = []
+
+        if batch:
+            stats.items += len(batch)
+            yield batch, position()
+
+    def _normalize(self, batches):
+        """ Stage 3: database rows of the entries accepted by the filter. """
+        stats = self.stats["normalize"]
+        for entries, position in batches:
+            if self.entry_filter is not None:
+                accepted = [entry for entry in entries if self.entry_filter(entry)]
+                self.counts["filtered"] += len(entries) - len(accepted)
+                entries = accepted
+
+            rows = [row for row in map(Channel.to_insert_row, entries) if row is not None]
+            stats.items += len(rows)
+            yield rows, position
+
+    def _dedupe(self, batches):
+        """
+        Stage 4: rows whose canonical URL was not seen earlier in this import, nor stored already
+        (in "append" mode). Only set lookups, the database is not queried.
+        """
+        stats = self.stats["dedupe"]
+        url_index = INSERT_COLUMNS.index("canonical_url")
+        stored = self._stored_urls or ()
+        seen = set()
+        for rows, position in batches:
+            unique_rows = []
+            for row in rows:
+                url = row[url_index]
+                if url in stored:
+                    self._already_stored += 1
+                elif url not in seen:
+                    seen.add(url)
+                    unique_rows.append(row)
+                else:
+                    self.counts["duplicates"] += 1
+
+            stats.items += len(unique_rows)
+            yield unique_rows, position
+
+    def _write(self, batches):
+        """ Stage 5 (calling thread): writes the rows to the database. """
+        if self.mode == "resync":
+            result = Source.resync_rows(
+                self.source.location,
+                self._track_offsets(batches),
+                batch_size=self.batch_size,
+                progress_callback=lambda staged: self._report_progress()
+            )
+            self.stats["write"].items = result["total"]
+            # The last staged batch was reported before the differences were written
+            self._report_progress()
+            return result
+
+        inserted = skipped = 0
+        for rows, position in batches:
+            with Channel.transaction():
+                batch_inserted, batch_skipped = Channel.insert_rows_bulk(rows)
+                if self._checkpoints:
+                    ImportCheckpoint.save(self.source.location, *position)
+
+            inserted += batch_inserted
+            skipped += batch_skipped
+            self.stats["write"].items += len(rows)
+            self._offset = position.offset
+            self._report_progress()
+
+        # The rows dropped by the dedupe stage were skipped as well
+        skipped += self._already_stored
+        return {"inserted": inserted, "skipped": skipped, "total": inserted + skipped}
+
+    def _track_offsets(self, batches):
+        """ Flattens the batches into rows, keeping track of the source offset reached. """
+        for rows, position in batches:
+            if not rows:
+                self._offset = position.offset
+                continue
+            yield from rows[:-1]
+            # Updated before the last row is handed over: the writer reports the progress as soon as it
+            # has the rows it asked for, without pulling the next one
+            self._offset = position.offset
+            yield rows[-1]
+
+    def _report_progress(self):
+        """ Send the progress of the import, based on the bytes of the source covered by the written rows. """
+        total_bytes = self.source.total_bytes
+        progress = min(100, int(self._offset / total_bytes * 100)) if total_bytes else 0
+
+        if self.progress_callback:
+            self.progress_callback(progress)
+
+        logger.info(f"Imported {self.stats['write'].items} channels from {self.source.location} ({progress}%)")
+
+
+def _import_source_worker(index, source, mode, entry_filter, batch_size, batches, cancelled):
+    """
+    Body of a MultiSourceImport worker process: fetches, parses, normalizes and dedupes one source,
+    streaming the batches of rows to the writer through the 'batches' queue as (index, rows, offset,
+    total_bytes) tuples.
+
+    :return: A dictionary with the source (to be committed by the writer once its rows are written),
+             'unchanged', 'duplicates', 'filtered' and 'parsed' (entries read from the playlist).
+    """
+    # The mode of the import only selects the cache entries of the source here, the writer is in the main process
+    pipeline = ImportPipeline(source, mode=mode, entry_filter=entry_filter, batch_size=batch_size, resume=False)
+    pipeline.counts = {"duplicates": 0, "filtered": 0}
+    pipeline._checkpoints = False  # The multi-source writer doesn't record checkpoints
+    unchanged = False
+
+    try:
+        # The stages of ImportPipeline, chained in this process
+        for rows, position in pipeline._dedupe(pipeline._normalize(pipeline._parse(pipeline._fetch()))):
+            item = (index, rows, position.offset, source.total_bytes)
+            while True:
+                if cancelled.is_set():
+                    raise ImportCancelled()
+                try:
+                    batches.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+    except SourceUnchanged as e:
+        logger.info(f"Skipped the import of {source.location}: {e}")
+        unchanged = True
+
+    return {"source": source, "unchanged": unchanged, "parsed": pipeline.stats["parse"].items, **pipeline.counts}
+
+
+class MultiSourceImport:
+    """
+    Imports several playlists at once. Each source is fetched, parsed and normalized in its own
+    process (parsing is CPU bound, so threads would share a single core), and the processes stream
+    their batches of rows through a bounded queue to a single writer running in the calling thread:
+
+        worker 1: fetch -> parse -> normalize -> dedupe --\
+        worker 2: fetch -> parse -> normalize -> dedupe ---+--> write
+        ...                                             --/
+
+    - "append" mode: the batches are inserted as they arrive, dropping canonical URLs already stored or
+      already seen in any of the sources (the first source to deliver a URL gets it).
+    - "resync" mode: each source is staged in its own temporary table as its batches arrive, then the
+      sources are resynced one after the other once every worker is done (see Source.resync). A source
+      that turns out to be empty is reported and left unchanged, the others are still resynced.
+
+    The sources and 'entry_filter' are sent to the worker processes, so the filter must be picklable
+    (e.g. a module-level function, not a lambda or a bound method of a QThread).
+    """
+
+    def __init__(self, sources, mode="append", entry_filter=None, progress_callback=None,
+                 batch_size=BATCH_SIZE, max_workers=None):
+        """
+        :param sources: List of FileSource / URLSource.
+        :param mode: "append" or "resync".
+        :param entry_filter: Optional picklable callable receiving each parsed entry, returning False to skip it.
+        :param progress_callback: Optional callable receiving the overall progress (0-100) after each written batch.
+        :param batch_size: Number of entries per batch.
+        :param max_workers: Number of worker processes, by default one per source up to the number of CPUs.
+        """
+        if mode not in ("append", "resync"):
+            raise ValueError(f"Unknown import mode: {mode}")
+
+        self.sources = list(sources)
+        self.mode = mode
+        self.entry_filter = entry_filter
+        self.progress_callback = progress_callback
+        self.batch_size = batch_size
+        self.max_workers = max_workers or min(len(self.sources), os.cpu_count() or 1) or 1
+
+        self._cancelled = None  # Event shared with the workers, created by run()
+        self._cancel_requested = False
+
+    def cancel(self):
+        """ Stop the import as soon as possible (the batches already written are kept). """
+        self._cancel_requested = True
+        if self._cancelled is not None:
+            self._cancelled.set()
+
+    def run(self):
+        """
+        Runs the import and blocks until it is finished.
+
+        :return: A dictionary with 'sources', the list of the results of each source (in the order of
+                 the sources: 'location', 'unchanged', 'parsed', 'duplicates', 'filtered', the counts
+                 of the write mode and 'error' for a source left unchanged because it was empty), the
+                 totals of the counts over every source, and 'elapsed_seconds'.
+        """
+        start = time.perf_counter()
+        count_keys = ("inserted", "updated", "deleted") if self.mode == "resync" else ("inserted", "skipped")
+        results = [
+            {"location": source.location, "unchanged": False, "parsed": 0, "duplicates": 0, "filtered": 0,
+             "error": None, **dict.fromkeys(count_keys, 0)}
+            for source in self.sources
+        ]
+        offsets = [0] * len(self.sources)
+        totals = [None] * len(self.sources)
+        stagings = {}
+        seen_urls = set()
+        stored_urls = Channel.get_canonical_urls() if self.mode == "append" else set()
+        url_index = INSERT_COLUMNS.index("canonical_url")
+
+        # Worker processes are spawned rather than forked: the application is multi-threaded (Qt)
+        context = multiprocessing.get_context("spawn")
+        with context.Manager() as manager, ProcessPoolExecutor(self.max_workers, mp_context=context) as executor:
+            batches = manager.Queue(QUEUE_SIZE * self.max_workers)
+            self._cancelled = manager.Event()
+            if self._cancel_requested:
+                self._cancelled.set()
+
+            futures = [
+                executor.submit(
+                    _import_source_worker, index, source, self.mode, self.entry_filter, self.batch_size, batches,
+                    self._cancelled
+                )
+                for index, source in enumerate(self.sources)
+            ]
+
+            try:
+                while True:
+                    try:
+                        index, rows, offset, total_bytes = batches.get(timeout=0.1)
+                    except queue.Empty:
+                        if self._cancelled.is_set():
+                            raise ImportCancelled("The import was cancelled.")
+                        # Stop at the first failed worker, or once every worker is done and the queue drained
+                        for future in futures:
+                            if future.done() and future.exception():
+                                raise future.exception()
+                        if all(future.done() for future in futures) and batches.empty():
+                            break
+                        continue
+
+                    offsets[index], totals[index] = offset, total_bytes
+                    if self.mode == "resync":
+                        if index not in stagings:
+                            stagings[index] = StagedResync(self.sources[index].location, table=f"sync_entries_{index}")
+                        stagings[index].stage(rows)
+                    else:
+                        unique_rows = []
+                        for row in rows:
+                            url = row[url_index]
+                            if url in stored_urls:
+                                results[index]["skipped"] += 1
+                            elif url not in seen_urls:
+                                seen_urls.add(url)
+                                unique_rows.append(row)
+                            else:
+                                results[index]["duplicates"] += 1
+
+                        inserted, skipped = Channel.insert_rows_bulk(unique_rows)
+                        results[index]["inserted"] += inserted
+                        results[index]["skipped"] += skipped
+
+                    self._report_progress(offsets, totals)
+
+                # Every worker is done: write the resyncs and remember the downloads
+                for index, future in enumerate(futures):
+                    worker_result = future.result()
+                    result = results[index]
+                    result["duplicates"] += worker_result["duplicates"]
+                    result["filtered"] = worker_result["filtered"]
+                    result["parsed"] = worker_result["parsed"]
+                    result["unchanged"] = worker_result["unchanged"]
+                    if result["unchanged"]:
+                        continue
+
+                    if self.mode == "resync":
+                        try:
+                            if index not in stagings:
+                                raise ValueError("The playlist has no channels, the source was left unchanged.")
+                            result.update(stagings[index].apply())
+                        except ValueError as e:
+                            result["error"] = str(e)
+                            logger.error(f"Import of {result['location']} failed: {e}")
+                            continue
+                    elif not result["parsed"]:
+                        result["error"] = "The playlist is invalid or cannot be parsed."
+                        logger.error(f"Import of {result['location']} failed: {result['error']}")
+                        continue
+
+                    worker_result["source"].commit()
+
+            except BaseException:
+                # Let the workers blocked on the full queue give up
+                self._cancelled.set()
+                raise
+            finally:
+                for staging in stagings.values():
+                    staging.discard()
+
+        summary = {"sources": results, "elapsed_seconds": time.perf_counter() - start}
+        for key in count_keys + ("duplicates", "filtered"):
+            summary[key] = sum(result[key] for result in results)
+
+        logger.info(
+            f"Imported {len(self.sources)} sources in {summary['elapsed_seconds']:.2f}s: "
+            + ", ".join(f"{summary[key]} {key}" for key in count_keys + ("duplicates", "filtered"))
+        )
+        return summary
+
+    def _report_progress(self, offsets, totals):
+        """ Send the overall progress, the average of the progress of each source. """
+        fractions = [min(1.0, offset / total) if total else 0.0 for offset, total in zip(offsets, totals)]
+        progress = int(sum(fractions) / len(fractions) * 100)
+
+        if self.progress_callback:
+            self.progress_callback(progress)
@@ -0,0 +1,149 @@
+import re
+
+# Attributes of an #EXTINF line, e.g. tvg-id="abc.us" group-title="News"
+ATTRIBUTE_PATTERN = re.compile(r'([\w-]+)="([^"]*)"')
+
+# Duration and attributes of an #EXTINF line, up to the comma before the name: commas and quotes
+# inside the quoted attribute values are skipped, those of the name are not
+HEAD_PATTERN = re.compile(r'[^,"]*(?:"[^"]*"[^,"]*)*')
+
+# Size of the blocks read from files and HTTP responses
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_lines(chunks):
+    """
+    Splits a stream of byte chunks into lines, keeping the line endings so the
+    caller can count the bytes consumed. Only one chunk and one line are held in memory.
+    """
+    pending = b""
+    for chunk in chunks:
+        if not chunk:
+            continue
+        lines = (pending + chunk).splitlines(keepends=True)
+
+        # The last line continues in the next chunk unless it is complete
+        pending = lines.pop() if not lines[-1].endswith((b"\n", b"\r")) else b""
+        yield from lines
+
+    if pending:
+        yield pending
+
+
+def iter_buffer_lines(buffer, start=0):
+    """
+    Splits a bytes-like buffer (e.g. an mmap of the file) into lines ending with '\n', keeping the
+    line endings, from the byte offset 'start'. The buffer is scanned in place: only the line being
+    yielded is copied, never the rest of the buffer.
+    """
+    end = len(buffer)
+    find = buffer.find
+    position = start
+    while position < end:
+        newline = find(b"\n", position)
+        if newline == -1:
+            yield buffer[position:]
+            return
+        yield buffer[position:newline + 1]
+        position = newline + 1
+
+
+def iter_file_chunks(file_object, chunk_size=CHUNK_SIZE):
+    """ Reads a binary file object in chunks. """
+    while chunk := file_object.read(chunk_size):
+        yield chunk
+
+
+def parse_extinf(line):
+    """
+    Parses the content of an #EXTINF line (without the '#EXTINF:' prefix), e.g.:
+
+        -1 tvg-id="abc.us" group-title="News",ABC News
+
+    :return: A (duration, attributes, name) tuple.
+    """
+    # The name starts after the first comma outside the quoted attribute values, it may hold commas and quotes
+    comma = HEAD_PATTERN.match(line).end()
+    if comma < len(line) and line[comma] != ",":
+        # Unterminated quoted value, the name starts at the next comma
+        comma = line.find(",", comma)
+    elif comma == len(line):
+        comma = -1
+    if comma == -1:
+        head, name = line, ""
+    else:
+        head, name = line[:comma], line[comma + 1:]
+
+    # Fast path for the most common form: '-1 key="value" ...'
+    space = head.find(" ")
+    duration = head[:space] if space != -1 else head
+
+    attributes = dict(ATTRIBUTE_PATTERN.findall(head, space + 1)) if space != -1 else {}
+
+    return duration.strip() or "-1", attributes, name.strip()
+
+
+class M3UParser:
+    """
+    Incremental M3U/EXTINF parser.
+    Lines are consumed one at a time and every entry is yielded as soon as its URL is read,
+    so memory stays flat whatever the size of the playlist.
+
+    Entries are dictionaries with the same keys as the channels table:
+    {"name": str, "url": str, "duration": str, "attributes": dict, "extras": list}
+    """
+
+    def __init__(self):
+        self.bytes_read = 0  # Bytes consumed from the input so far
+        self.entries_parsed = 0  # Entries yielded so far
+
+    def parse(self, lines):
+        """
+        Generator yielding the playlist entries.
+
+        :param lines: Iterable of lines, as bytes (decoded as UTF-8) or str.
+        """
+        duration, attributes, name, extras = "-1", {}, None, []
+
+        for raw_line in lines:
+            if isinstance(raw_line, bytes):
+                self.bytes_read += len(raw_line)
+                line = raw_line.decode("utf-8", errors="replace")
+            else:
+                self.bytes_read += len(raw_line.encode("utf-8"))
+                line = raw_line
+
+            line = line.strip().lstrip("\ufeff")  # Drop the byte order mark of the first line
+            if not line:
+                continue
+
+            if line[0] != "#":
+                # A URL closes the current entry
+                self.entries_parsed += 1
+                yield {
+                    "name": name or line,
+                    "url": line,
+                    "duration": duration,
+                    "attributes": attributes,
+                    "extras": extras
+                }
+                duration, attributes, name, extras = "-1", {}, None, []
+
+            elif line.startswith("#EXTINF:"):
+                duration, attributes, name = parse_extinf(line[8:])
+
+            elif line.startswith("#EXTGRP:"):
+                attributes.setdefault("group-title", line[8:].strip())
+
+            elif line.startswith("#EXTM3U"):
+                continue
+
+            else:
+                # Player options such as #EXTVLCOPT or #KODIPROP are kept as they are
+                extras.append(line)
+
+
+def parse_file(file_path):
+    """ Generator yielding the entries of a playlist file, read in chunks. """
+    with open(file_path, "rb") as file:
+        yield from M3UParser().parse(iter_lines(iter_file_chunks(file)))
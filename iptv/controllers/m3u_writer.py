@@ -0,0 +1,38 @@
+def format_extinf(duration, attributes, name):
+    """
+    Builds an #EXTINF line, the reverse of m3u_parser.parse_extinf(), e.g.:
+
+        #EXTINF:-1 tvg-id="abc.us" group-title="News",ABC News
+    """
+    # Attribute values can't contain double quotes in the M3U syntax
+    formatted_attributes = "".join(
+        f' {key}="{str(value).replace(chr(34), chr(39))}"' for key, value in attributes.items()
+    )
+    return f"#EXTINF:{duration or '-1'}{formatted_attributes},{name or ''}"
+
+
+def iter_playlist_lines(channels):
+    """
+    Generator yielding the lines (without line endings) of an M3U playlist of the channels.
+    Channels are only read one at a time, so it can be fed from Channel.iter_channels().
+    """
+    yield "#EXTM3U"
+    for channel in channels:
+        yield format_extinf(channel.duration, channel.attributes, channel.name)
+        # Player options (#EXTVLCOPT, #KODIPROP...) go between the #EXTINF line and the URL
+        yield from channel.extras
+        yield channel.url
+
+
+def write_playlist(channels, file_object):
+    """
+    Writes an M3U playlist of the channels to a text file object.
+    :return: The number of channels written.
+    """
+    count = 0
+    for line in iter_playlist_lines(channels):
+        file_object.write(line + "\n")
+        if not line.startswith("#"):
+            # Every channel ends with its URL, the only line that is not a directive
+            count += 1
+    return count
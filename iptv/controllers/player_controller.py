@@ -1,18 +1,14 @@
-import requests
 from PyQt6.QtCore import QThread, pyqtSignal
 
 from iptv.config.logger import logger
+from iptv.controllers.helpers import probe_url
 from iptv.event_bus import event_bus
 from iptv.models.channel_manager import ChannelManager
 
 
 def is_valid_url(url):
-    """ Validate if the URL is accessible. """
-    try:
-        response = requests.head(url, timeout=5)
-        return response.status_code == 200
-    except requests.exceptions.RequestException:
-        return False
+    """ Validate if the URL is accessible, reusing the result of a recent probe (e.g. by the tuning). """
+    return probe_url(url).ok
 
 
 class PlayerController(QThread):
@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import time
+
+from iptv.config.logger import logger
+from iptv.config.settings import get_cache_dir
+
+
+class PlaylistCacheEntry:
+    __slots__ = ("url", "etag", "last_modified", "sha256", "size", "fetched_at")
+
+    def __init__(self, url, etag=None, last_modified=None, sha256=None, size=None, fetched_at=None):
+        """
+        What is known about the last successfully imported download of a playlist:
+        - etag / last_modified (str): Validators sent by the server, replayed in conditional requests.
+        - sha256 (str): Hash of the (decompressed) playlist content.
+        - size (int): Size of the (decompressed) playlist content, in bytes.
+        - fetched_at (float): UNIX timestamp of the download.
+        """
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.sha256 = sha256
+        self.size = size
+        self.fetched_at = fetched_at
+
+    def __repr__(self):
+        return f"<PlaylistCacheEntry(url={self.url}, etag={self.etag}, sha256={self.sha256})>"
+
+    @property
+    def has_validators(self):
+        """ Whether the server can answer a conditional request for this playlist. """
+        return bool(self.etag or self.last_modified)
+
+    def conditional_headers(self):
+        """ Headers turning the next request into a conditional one (answered by a 304 if unchanged). """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class PlaylistCache:
+    """
+    On-disk cache of the playlist downloads, one small JSON file per playlist URL and scope in the
+    'playlists' directory of the cache directory (see get_cache_dir()).
+    Only metadata is kept, not the playlists themselves.
+
+    The scope separates the kinds of imports of a URL (e.g. "append" and "resync"): a playlist
+    unchanged since it was imported one way still has to be imported the other way.
+    """
+
+    def __init__(self, namespace="", cache_dir=None):
+        """
+        :param namespace: Separates the entries of different databases (e.g. the database path), since
+                          a playlist imported in one database is not imported in the others.
+        """
+        self.namespace = namespace
+        self.directory = os.path.join(cache_dir or get_cache_dir(), "playlists")
+
+    def _path(self, url, scope):
+        """ File of the cache entry of a URL. """
+        key = hashlib.sha256(f"{self.namespace}\n{scope}\n{url}".encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, url, scope=""):
+        """ Returns the cache entry of a URL, or None if it was never imported (or the entry is unreadable). """
+        try:
+            with open(self._path(url, scope), encoding="utf-8") as file:
+                data = json.load(file)
+            return PlaylistCacheEntry(**{key: data.get(key) for key in PlaylistCacheEntry.__slots__})
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"Ignoring the unreadable playlist cache entry of {url}: {e}")
+            return None
+
+    def store(self, entry, scope=""):
+        """ Saves a cache entry, replacing the previous one atomically. """
+        entry.fetched_at = entry.fetched_at or time.time()
+        path = self._path(entry.url, scope)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump({key: getattr(entry, key) for key in PlaylistCacheEntry.__slots__}, file)
+            os.replace(temp_path, path)
+        except OSError as e:
+            # The cache is only an optimization, the next download will simply be a full one
+            logger.warning(f"Could not save the playlist cache entry of {entry.url}: {e}")
+
+    def delete(self, url, scope=""):
+        """ Forgets a URL, so its next download is a full one. """
+        try:
+            os.remove(self._path(url, scope))
+        except FileNotFoundError:
+            pass
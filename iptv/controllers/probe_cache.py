@@ -0,0 +1,168 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
+
+from iptv.models.url import canonical_url
+
+# Seconds a successful probe is reused
+POSITIVE_TTL = 300
+# Seconds a failed probe is reused, shorter so a channel that comes back is noticed soon
+NEGATIVE_TTL = 60
+# Maximum number of cached probes, the least recently used ones are evicted first
+MAX_ENTRIES = 50000
+
+# A probe result and the UNIX timestamp of the probe that produced it
+CachedProbe = namedtuple("CachedProbe", ["result", "probed_at"])
+
+
+class ProbeCache:
+    """
+    Process-wide cache of the results of the probes of stream URLs, keyed by their canonical form.
+    Shared by the tuning and the player, so a URL probed seconds ago by one of them isn't probed
+    again by the other.
+
+    Concurrent probes of the same URL are coalesced: the first caller probes, the others wait for its
+    result, whether they run in threads (probe()) or in event loops (probe_async()).
+
+    Thread-safe.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, positive_ttl=POSITIVE_TTL, negative_ttl=NEGATIVE_TTL, max_entries=MAX_ENTRIES):
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # Canonical URL -> CachedProbe, the least recently used first
+        self._in_flight = {}  # Canonical URL -> Future of the probe running for it
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls):
+        """ Get the singleton instance of the ProbeCache """
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = ProbeCache()
+            return cls._instance
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _get(self, key):
+        """ Fresh cached probe of a canonical URL, or None. Must be called holding the lock. """
+        cached = self._entries.get(key)
+        if cached is None:
+            return None
+
+        ttl = self.positive_ttl if cached.result.ok else self.negative_ttl
+        if time.time() - cached.probed_at >= ttl:
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return cached
+
+    def _put(self, key, cached):
+        """ Caches a probe of a canonical URL, evicting the least recently used ones. Must be called holding the lock. """
+        self._entries[key] = cached
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, url):
+        """ Returns the fresh CachedProbe of a URL, or None if it wasn't probed recently. """
+        with self._lock:
+            return self._get(canonical_url(url))
+
+    def put(self, url, result, probed_at=None):
+        """ Caches the result of a probe of a URL made elsewhere. """
+        cached = CachedProbe(result, probed_at if probed_at is not None else time.time())
+        with self._lock:
+            self._put(canonical_url(url), cached)
+        return cached
+
+    def invalidate(self, url=None):
+        """ Forgets the probe of a URL, or of every URL if omitted. """
+        with self._lock:
+            if url is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(canonical_url(url), None)
+
+    def _claim(self, url):
+        """
+        Looks a URL up, registering a probe in flight for it when it has to be probed.
+        :return: A (key, cached, future, owner) tuple: the CachedProbe if fresh, otherwise the Future of the probe
+                 in flight, 'owner' being True when the caller has to run the probe and resolve the future.
+        """
+        key = canonical_url(url)
+        with self._lock:
+            cached = self._get(key)
+            if cached is not None:
+                return key, cached, None, False
+
+            future = self._in_flight.get(key)
+            if future is not None:
+                return key, None, future, False
+
+            future = self._in_flight[key] = Future()
+            return key, None, future, True
+
+    def _resolve(self, key, future, result=None, error=None):
+        """ Stores the result of a probe and wakes up the callers waiting for it. """
+        with self._lock:
+            del self._in_flight[key]
+            if error is None:
+                cached = CachedProbe(result, time.time())
+                self._put(key, cached)
+
+        if error is None:
+            future.set_result(cached)
+            return cached
+        future.set_exception(error)
+        return None
+
+    def probe(self, url, probe_function):
+        """
+        Returns the fresh cached probe of a URL, or probes it.
+
+        :param url: The URL to probe.
+        :param probe_function: Callable without arguments returning a ProbeResult, only called on a cache miss.
+        :return: A CachedProbe.
+        """
+        key, cached, future, owner = self._claim(url)
+        if cached is not None:
+            return cached
+        if not owner:
+            return future.result()
+
+        try:
+            result = probe_function()
+        except BaseException as e:
+            self._resolve(key, future, error=e)
+            raise
+        return self._resolve(key, future, result)
+
+    async def probe_async(self, url, probe_coroutine_function):
+        """
+        Asynchronous version of probe().
+
+        :param url: The URL to probe.
+        :param probe_coroutine_function: Callable without arguments returning an awaitable of a ProbeResult,
+                                         only called on a cache miss.
+        :return: A CachedProbe.
+        """
+        key, cached, future, owner = self._claim(url)
+        if cached is not None:
+            return cached
+        if not owner:
+            return await asyncio.wrap_future(future)
+
+        try:
+            result = await probe_coroutine_function()
+        except BaseException as e:
+            self._resolve(key, future, error=e)
+            raise
+        return self._resolve(key, future, result)
@@ -0,0 +1,331 @@
+"""
+Lightweight probes of stream URLs, reading only a few KB per channel:
+
+1. HEAD request: a 404/410 answer is final, otherwise the content type tells HLS playlists apart.
+   Many origins reject HEAD (or never answer it, HEAD_TIMEOUT) or answer 200 for dead streams,
+   so a 200 alone doesn't make a channel alive.
+2. GET request of the first bytes (Range header): the stream is alive if the server sends data.
+3. HLS playlists (.m3u8) are read and parsed instead: a master playlist is followed to its first variant
+   (a single hop), and the first segment of the media playlist is requested like in step 2.
+
+Every body is read within a byte budget shared by the steps of the probe.
+"""
+import asyncio
+import time
+from collections import namedtuple
+from urllib.parse import urljoin, urlsplit
+
+import aiohttp
+
+from iptv.config.logger import logger
+
+# Outcome of a single probe of a channel URL. 'dns_ms' and 'connect_ms' are the parts of the latency
+# spent resolving the host and opening connections (TCP and TLS handshakes), None when not traced.
+# 'connect_failed' tells the probe failed before reaching the host: DNS failure, connection refused or timed out
+ProbeResult = namedtuple(
+    "ProbeResult", ["ok", "status", "latency_ms", "bytes_read", "dns_ms", "connect_ms", "connect_failed"],
+    defaults=(None, None, False)
+)
+
+# Maximum number of body bytes read by a probe, over all its requests
+BYTE_BUDGET = 32 * 1024
+# Bytes requested from a stream or a segment, any data received proves it is served
+SAMPLE_BYTES = 2048
+# Timeout in seconds of a whole probe, used when probing without a session
+PROBE_TIMEOUT = 5
+# Timeout in seconds of opening a connection, shorter than the probe so a host that doesn't accept
+# connections is told apart from a stream that is slow to answer
+CONNECT_TIMEOUT = 3
+# Seconds to wait for the answer to the HEAD request once connected: origins that never answer HEAD
+# are given up on early, leaving the rest of the probe to the GET request
+HEAD_TIMEOUT = 1.5
+
+# Answers to the HEAD request meaning the stream doesn't exist, no GET request is sent
+GONE_STATUSES = {404, 410}
+# Content types of HLS playlists
+HLS_CONTENT_TYPES = {
+    "application/vnd.apple.mpegurl", "application/x-mpegurl", "audio/mpegurl", "audio/x-mpegurl"
+}
+HLS_EXTENSIONS = (".m3u8", ".m3u")
+
+
+def parse_hls_playlist(text, base_url):
+    """
+    Parses an HLS playlist.
+    :return: A (variant_urls, segment_urls) tuple of absolute URLs. A master playlist only has variants,
+             a media playlist only has segments.
+    """
+    variants, segments = [], []
+    next_is_variant = False
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("#"):
+            # The URI following an #EXT-X-STREAM-INF tag is a variant playlist
+            if line.startswith("#EXT-X-STREAM-INF"):
+                next_is_variant = True
+            continue
+
+        (variants if next_is_variant else segments).append(urljoin(base_url, line))
+        next_is_variant = False
+
+    return variants, segments
+
+
+def _is_hls_url(url):
+    """ Whether the path of a URL has the extension of an HLS playlist. """
+    try:
+        return urlsplit(url).path.lower().endswith(HLS_EXTENSIONS)
+    except ValueError:
+        return False
+
+
+def _is_hls_response(response, head=b""):
+    """ Whether a response is an HLS playlist, from its content type or its first bytes. """
+    return response.content_type in HLS_CONTENT_TYPES or head.lstrip(b"\xef\xbb\xbf \t\r\n").startswith(b"#EXTM3U")
+
+
+def probe_client_timeout(timeout=PROBE_TIMEOUT):
+    """ Timeouts of a session making probes: 'timeout' for each request, CONNECT_TIMEOUT at most to connect. """
+    sock_connect = CONNECT_TIMEOUT if timeout is None else min(CONNECT_TIMEOUT, timeout)
+    return aiohttp.ClientTimeout(total=timeout, sock_connect=sock_connect)
+
+
+class ProbeTimings:
+    __slots__ = ("dns_ms", "connect_ms", "_dns_started", "_connect_started", "_dns_before_connect")
+
+    def __init__(self):
+        """
+        Time spent by the requests of a probe resolving hosts and opening connections, filled in by the
+        trace configuration of probe_trace_config(). Reused keep-alive connections add nothing.
+        """
+        self.dns_ms = None
+        self.connect_ms = None
+        self._dns_started = self._connect_started = self._dns_before_connect = 0.0
+
+
+def _timings(trace_config_ctx):
+    """ The ProbeTimings of a traced request, or None if the request is not a probe. """
+    timings = trace_config_ctx.trace_request_ctx
+    return timings if isinstance(timings, ProbeTimings) else None
+
+
+async def _on_request_start(session, trace_config_ctx, params):
+    timings = _timings(trace_config_ctx)
+    if timings is not None and timings.dns_ms is None:
+        timings.dns_ms = timings.connect_ms = 0.0
+
+
+async def _on_dns_resolvehost_start(session, trace_config_ctx, params):
+    timings = _timings(trace_config_ctx)
+    if timings is not None:
+        timings._dns_started = time.perf_counter()
+
+
+async def _on_dns_resolvehost_end(session, trace_config_ctx, params):
+    timings = _timings(trace_config_ctx)
+    if timings is not None:
+        timings.dns_ms += (time.perf_counter() - timings._dns_started) * 1000
+
+
+async def _on_connection_create_start(session, trace_config_ctx, params):
+    timings = _timings(trace_config_ctx)
+    if timings is not None:
+        timings._connect_started = time.perf_counter()
+        timings._dns_before_connect = timings.dns_ms
+
+
+async def _on_connection_create_end(session, trace_config_ctx, params):
+    timings = _timings(trace_config_ctx)
+    if timings is not None:
+        # Opening a connection starts with resolving the host, which is counted apart
+        dns_ms = timings.dns_ms - timings._dns_before_connect
+        timings.connect_ms += (time.perf_counter() - timings._connect_started) * 1000 - dns_ms
+
+
+def probe_trace_config():
+    """ aiohttp trace configuration measuring the DNS and connection times of the probes of a session. """
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(_on_request_start)
+    trace_config.on_dns_resolvehost_start.append(_on_dns_resolvehost_start)
+    trace_config.on_dns_resolvehost_end.append(_on_dns_resolvehost_end)
+    trace_config.on_connection_create_start.append(_on_connection_create_start)
+    trace_config.on_connection_create_end.append(_on_connection_create_end)
+    return trace_config
+
+
+class StreamProbe:
+    """
+    A single probe of a stream URL, see the module documentation for the steps.
+    Not reusable: each probe counts its own bytes against the budget.
+    """
+
+    def __init__(self, session, byte_budget=BYTE_BUDGET):
+        self.session = session
+        self.budget = byte_budget
+        self.bytes_read = 0
+        self.status = None
+        self.timings = ProbeTimings()
+
+    async def _read(self, response, limit, complete=False):
+        """
+        Reads up to 'limit' bytes of a body (and never more than the remaining budget).
+        :param complete: Keep reading until the end of the body or the limit, instead of returning the first data.
+        """
+        data = b""
+        while True:
+            limit = min(limit, self.budget - self.bytes_read)
+            if limit <= len(data):
+                break
+            chunk = await response.content.read(limit - len(data))
+            if not chunk:
+                break
+            data += chunk
+            self.bytes_read += len(chunk)
+            if not complete:
+                break
+        return data
+
+    async def _sample(self, url):
+        """
+        Requests the first bytes of a stream or a segment.
+        :return: A (served, playlist) tuple: 'served' is True if the server sent data, 'playlist' is the
+                 (text, url) of the HLS playlist served instead of a stream, if any.
+        """
+        headers = {"Range": f"bytes=0-{SAMPLE_BYTES - 1}"}
+        async with self.session.get(url, headers=headers, trace_request_ctx=self.timings) as response:
+            self.status = response.status
+            if response.status not in (200, 206):
+                return False, None
+
+            data = await self._read(response, SAMPLE_BYTES)
+            if _is_hls_response(response, data):
+                # A playlist served from a URL without the .m3u8 extension, read the rest of it
+                data += await self._read(response, self.budget, complete=True)
+                return True, (self._decode_playlist(data), str(response.url))
+            return bool(data), None
+
+    async def _get_playlist(self, url):
+        """ Downloads an HLS playlist within the budget, returning its (text, url) or None. """
+        async with self.session.get(url, trace_request_ctx=self.timings) as response:
+            self.status = response.status
+            if response.status != 200:
+                return None
+            data = await self._read(response, self.budget, complete=True)
+            # Relative URIs are resolved against the URL the playlist was redirected to
+            return self._decode_playlist(data), str(response.url)
+
+    def _decode_playlist(self, data):
+        """ Decodes a playlist, dropping its last line if the budget cut it. """
+        if self.bytes_read >= self.budget:
+            data = data[:data.rfind(b"\n") + 1]
+        return data.decode("utf-8", errors="replace")
+
+    async def _check_playlist(self, playlist):
+        """ Checks an HLS playlist: its first variant is followed (once) and its first segment sampled. """
+        if playlist is None:
+            return False
+
+        variants, segments = parse_hls_playlist(*playlist)
+        if variants:
+            # Master playlist: follow its first variant, a single hop
+            playlist = await self._get_playlist(variants[0])
+            if playlist is None:
+                return False
+            _, segments = parse_hls_playlist(*playlist)
+
+        if not segments:
+            # Empty live playlist (or a master playlist pointing to another one)
+            return False
+
+        served, _ = await self._sample(segments[0])
+        return served
+
+    async def _probe(self, url):
+        """ Runs the steps of the probe, returning whether the stream is alive. """
+        if _is_hls_url(url):
+            return await self._check_playlist(await self._get_playlist(url))
+
+        is_hls = False
+        session_timeout = self.session.timeout
+        head_timeout = aiohttp.ClientTimeout(
+            total=session_timeout.total, sock_connect=session_timeout.sock_connect, sock_read=HEAD_TIMEOUT
+        )
+        try:
+            async with self.session.head(
+                url, allow_redirects=True, timeout=head_timeout, trace_request_ctx=self.timings
+            ) as response:
+                self.status = response.status
+                if response.status in GONE_STATUSES:
+                    return False
+                is_hls = 200 <= response.status < 300 and _is_hls_response(response)
+                url = str(response.url)
+        except (aiohttp.ClientConnectorError, aiohttp.ConnectionTimeoutError):
+            # The host can't be reached, a GET request won't do better
+            raise
+        except aiohttp.ClientError:
+            # HEAD requests rejected by closing the connection or left unanswered, try with a GET request
+            pass
+
+        if is_hls:
+            return await self._check_playlist(await self._get_playlist(url))
+
+        served, playlist = await self._sample(url)
+        if playlist is not None:
+            return await self._check_playlist(playlist)
+        return served
+
+    async def run(self, url, timeout=None):
+        """
+        Probes a stream URL.
+        :param timeout: Optional timeout in seconds of the whole probe (the timeout of the session applies to each request).
+        :return: A ProbeResult, 'status' being the status code of the last response (None if none arrived).
+                 The DNS and connection times are only measured if the session has the probe_trace_config().
+        """
+        start = time.perf_counter()
+        connect_failed = False
+        try:
+            ok = await asyncio.wait_for(self._probe(url), timeout)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            # Connection errors, timeouts and invalid or non HTTP URLs: the channel is considered offline
+            logger.error(f"Error checking URL '{url}': {e or type(e).__name__}")
+            ok = False
+            # Only the host resolution and the connection tell the host is down: a read timeout comes from
+            # a host that accepted the connection, and a TLS error from a host that answered the handshake
+            connect_failed = (
+                isinstance(e, (aiohttp.ClientConnectorError, aiohttp.ConnectionTimeoutError))
+                and not isinstance(e, aiohttp.ClientSSLError)
+            )
+
+        return ProbeResult(
+            ok, self.status, (time.perf_counter() - start) * 1000, self.bytes_read,
+            self.timings.dns_ms, self.timings.connect_ms, connect_failed
+        )
+
+
+async def probe_stream(url, session, timeout=None, byte_budget=BYTE_BUDGET):
+    """
+    Probes a stream URL with the connections of an aiohttp session.
+
+    :param url: The URL to test.
+    :param session: The aiohttp session to make the HTTP requests.
+    :param timeout: Optional timeout in seconds of the whole probe.
+    :param byte_budget: Maximum number of body bytes read.
+    :return: A ProbeResult.
+    """
+    return await StreamProbe(session, byte_budget).run(url, timeout)
+
+
+def probe_stream_sync(url, timeout=PROBE_TIMEOUT, byte_budget=BYTE_BUDGET):
+    """
+    Probes a stream URL from synchronous code, with a session of its own.
+    Runs its own event loop, so it must be called from a thread without one.
+    """
+    async def run():
+        async with aiohttp.ClientSession(
+            timeout=probe_client_timeout(timeout), trace_configs=[probe_trace_config()]
+        ) as session:
+            return await probe_stream(url, session, timeout, byte_budget)
+
+    return asyncio.run(run())
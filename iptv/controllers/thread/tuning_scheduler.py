@@ -0,0 +1,26 @@
+import threading
+
+from PyQt6.QtCore import QThread
+
+from iptv.controllers.tuning_scheduler import TuningScheduler
+
+
+class TuningSchedulerThread(QThread):
+    """
+    Thread class running the background tuning while the application is open,
+    probing a few channels at a time within a budget per minute.
+    """
+
+    def __init__(self, budget_per_minute):
+        super().__init__()
+        self.scheduler = TuningScheduler(budget_per_minute)
+        self.stop_event = threading.Event()
+
+    def run(self):
+        """ This method runs in a separate thread until stop() is called. """
+        self.scheduler.run(self.stop_event)
+
+    def stop(self):
+        """ Stops the background tuning, waiting for the probes in progress. """
+        self.stop_event.set()
+        self.wait()
@@ -1,12 +1,7 @@
-import random
-import time
-from concurrent.futures import ThreadPoolExecutor
-
 from PyQt6.QtCore import QThread, pyqtSignal
-from ipytv import playlist
 
 from iptv.config.logger import logger
-from iptv.controllers.helpers import process_channel_entry
+from iptv.controllers.import_pipeline import ImportPipeline, URLSource
 
 
 class URLLoaderThread(QThread):
@@ -24,36 +19,16 @@ class URLLoaderThread(QThread):
 
     def run(self):
         """
-        Loads the playlist from the provided URL and processes the channels in batches.
+        Streams the playlist from the provided URL through the import pipeline and resyncs the
+        channels of that source: new entries are inserted, changed ones updated and the ones gone
+        from the playlist deleted.
         """
         try:
-            # Load the playlist from the URL using ipytv
-            pl = playlist.loadu(self.url)
-
-            if not pl.get_channels():
-                logger.error(f"Error occurred: The URL is invalid or cannot be parsed")
-                raise ValueError("The URL is invalid or cannot be parsed.")
-
-            # Extract the channel data from the playlist
-            channels = [{"name": entry.name, "url": entry.url} for entry in pl.get_channels()]
-            total_channels = len(channels)
-            batch_size = 100
-            max_workers = min(batch_size, total_channels)
-
-            # Process channels in batches
-            for i in range(0, total_channels, batch_size):
-                batch = channels[i:i + batch_size]
-                with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                    list(executor.map(process_channel_entry, batch))
-
-                # Emit progress update after each batch
-                progress = int((i + len(batch)) / total_channels * 100)
-                self.progress_signal.emit(progress)
-
-                logger.info(f"Processed {i + len(batch)} out of {total_channels} channels ({progress}%)")
-
-                # Simulate some delay between batches
-                time.sleep(random.uniform(0.1, 0.3))
+            # Apply only the differences with the channels previously loaded from this URL
+            result = ImportPipeline(URLSource(self.url), mode="resync", progress_callback=self.progress_signal.emit).run()
+            if result["unchanged"]:
+                logger.info(f"The playlist {self.url} did not change since its last import")
+                self.progress_signal.emit(100)
 
             # Emit completion signal after all batches are processed
             self.completed_signal.emit()
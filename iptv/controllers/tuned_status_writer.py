@@ -0,0 +1,114 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from iptv.config.logger import logger
+from iptv.models.database.channel import Channel
+from iptv.models.database.connection import close_thread_connections
+from iptv.models.database.probe_history import ProbeHistory
+
+
+class TunedStatusWriter:
+    """
+    Collects the results of the channel checks and writes them to the database in batches.
+    A batch is flushed once it holds 'flush_size' results or 'flush_interval' seconds have
+    passed since the last flush, so the probe workers never wait for the database.
+
+    Each flush stores the probes in the probe history and sets the 'tuned' status from the
+    rolling health score of the channel, so a single failed probe doesn't hide a healthy channel.
+
+    In background mode the batches are written by a thread of the writer, so the caller (e.g. the event
+    loop of the tuning) never waits for a database lock held by another writer. A single batch is written
+    at a time, the results added meanwhile are gathered into the next one. An error writing a batch is
+    raised by the next add() or flush().
+
+    Not thread-safe: results must be added from a single thread (the one owning the writer).
+    """
+
+    def __init__(self, flush_size=500, flush_interval=2.0, background=False):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.pending = []
+        self.written = 0
+        self.last_flush = time.monotonic()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="TunedStatusWriter") if background else None
+        self._writing = None  # Future of the batch being written by the thread of the writer
+
+    def add(self, channel_id, result, checked_at=None):
+        """
+        Queue the result of a channel check, flushing the batch if a threshold is reached.
+
+        :param channel_id: ID of the checked channel.
+        :param result: The ProbeResult of the check.
+        :param checked_at: UNIX timestamp of the check (defaults to now).
+        """
+        self.pending.append((channel_id, result, checked_at if checked_at is not None else time.time()))
+
+        if len(self.pending) >= self.flush_size or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush(wait=False)
+
+    def add_unreachable(self, channel_id, checked_at=None):
+        """
+        Queue a channel that wasn't probed because its host can't be reached (see HostGuard).
+        It is marked as not tuned, without adding a probe to its history.
+        """
+        self.add(channel_id, None, checked_at)
+
+    def flush(self, wait=True):
+        """
+        Write every queued result in a single transaction.
+        :param wait: In background mode, False to return without waiting for the batch to be written (nor
+                     for the one being written: the results are then kept for the next flush).
+        """
+        if self._executor is None:
+            self._write(self.pending)
+            self.pending = []
+            self.last_flush = time.monotonic()
+            return
+
+        if self._writing is not None:
+            if not wait and not self._writing.done():
+                return
+            writing, self._writing = self._writing, None
+            writing.result()  # Raises the error of the previous batch, if any
+
+        if self.pending:
+            self._writing = self._executor.submit(self._write, self.pending)
+            self.pending = []
+            if wait:
+                writing, self._writing = self._writing, None
+                writing.result()
+        self.last_flush = time.monotonic()
+
+    def _write(self, pending):
+        """ Writes a batch of results in a single transaction. """
+        if not pending:
+            return
+
+        with Channel.transaction():
+            health = ProbeHistory.record_bulk(
+                (
+                    channel_id, checked_at, result.ok, result.status, result.latency_ms, result.bytes_read,
+                    result.dns_ms, result.connect_ms
+                )
+                for channel_id, result, checked_at in pending
+                if result is not None
+            )
+            self.written += Channel.update_tuned_bulk(
+                (channel_id, result is not None and health[channel_id].is_healthy, checked_at)
+                for channel_id, result, checked_at in pending
+                if result is None or channel_id in health
+            )
+
+        logger.debug(f"Flushed {len(pending)} tuning results ({self.written} written so far)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Keep the results gathered so far even if the tuning was interrupted
+        try:
+            self.flush()
+        finally:
+            if self._executor is not None:
+                self._executor.submit(close_thread_connections)
+                self._executor.shutdown()
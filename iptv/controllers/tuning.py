@@ -0,0 +1,235 @@
+import asyncio
+from collections import deque
+
+import aiohttp
+
+from iptv.config.logger import logger
+from iptv.controllers.dns_cache import CachingResolver
+from iptv.controllers.helpers import request_probe_async
+from iptv.controllers.host_guard import HostGuard
+from iptv.controllers.probe_cache import ProbeCache
+from iptv.controllers.stream_probe import probe_client_timeout, probe_trace_config
+from iptv.controllers.tuned_status_writer import TunedStatusWriter
+from iptv.models.database.channel import Channel
+from iptv.models.url import url_host
+
+# Probes in flight at the same time, over all the hosts
+MAX_CONCURRENCY = 100
+# Probes in flight at the same time against a single host
+PER_HOST_LIMIT = 6
+# Timeout in seconds of a single probe
+PROBE_TIMEOUT = 5
+# Maximum number of channels read ahead of the probes (about 1 KB each). The hosts of the channels read
+# ahead are resolved in the meantime. Playlists are usually grouped by host: a run of channels of the same
+# host doesn't stop the other hosts as long as it fits in the read ahead, a longer one is probed at the
+# pace of its host (PER_HOST_LIMIT probes at a time) until the reading gets past it
+READ_AHEAD = 10000
+
+
+class TuningEngine:
+    """
+    Probes channels concurrently with asyncio, over a single aiohttp session whose keep-alive
+    connections are shared by every probe.
+
+    There are no batches: a new probe starts as soon as one finishes, within a global limit of
+    probes in flight and a limit per host, and the results are handed over as they arrive.
+    The channels are read lazily, so they can be streamed from the database.
+
+    Up to 'read_ahead' channels are read ahead, grouped by host: each host has a queue drained by at most
+    'per_host_limit' workers, which probe its channels one after the other over the same warm
+    keep-alive connections. A host is resolved (see CachingResolver) as soon as its first channel
+    is read, so its addresses are ready when its first probe starts.
+
+    The probes go through the ProbeCache: URLs probed recently are not requested again. Each host
+    is protected by the HostGuard: its probes are rate limited, and once it stops accepting connections
+    its channels are skipped without waiting for the timeout of each one. Skipped channels are handed
+    to 'on_skipped' to be marked as not working, but no result is cached for them: the player still
+    probes them itself.
+    """
+
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, per_host_limit=PER_HOST_LIMIT, timeout=PROBE_TIMEOUT,
+                 host_guard=None, read_ahead=READ_AHEAD):
+        self.max_concurrency = max(1, max_concurrency)
+        self.per_host_limit = max(1, per_host_limit)
+        self.timeout = timeout
+        self.read_ahead = max(self.max_concurrency, read_ahead)
+        self.host_guard = host_guard or HostGuard.get_instance()
+
+    async def run(self, channels, on_result, on_skipped=None):
+        """
+        Probes the channels.
+
+        :param channels: Iterable of channels.
+        :param on_result: Callable receiving (channel, probe_result, probed_at) for each channel, in the
+                          order the probes finish. It runs in the event loop, so it must not block for long.
+        :param on_skipped: Optional callable receiving the channels not probed because the circuit of their
+                           host is open (see HostGuard), in the event loop too.
+        :return: The number of channels probed.
+        """
+        probe_cache = ProbeCache.get_instance()
+        in_flight = asyncio.Semaphore(self.max_concurrency)
+        queued = asyncio.Semaphore(self.read_ahead)
+        host_queues = {}  # Host -> deque of its channels waiting for a worker
+        host_workers = {}  # Host -> number of workers draining its queue
+        tasks = set()
+        errors = []
+        probed = 0
+
+        async def probe_host(host, url):
+            reachable = None
+            try:
+                await self.host_guard.acquire(host)
+                async with in_flight:
+                    result = await request_probe_async(url, session, self.timeout)
+                # Only failing to resolve the host or to connect to it shows it is down: a stream that
+                # doesn't answer in time or an error status doesn't say anything of the other channels
+                reachable = not result.connect_failed
+                return result
+            finally:
+                self.host_guard.record(host, reachable)
+
+        async def probe(host, channel):
+            nonlocal probed
+            try:
+                # Channels probed recently (e.g. by the player) are not probed again
+                cached = probe_cache.get(channel.url)
+                if cached is None:
+                    # Hosts that stopped accepting connections are not probed until their cooldown is over.
+                    # Checked ahead of the cache, so a channel that wasn't probed never gets a cached result
+                    if not self.host_guard.allow(host):
+                        if on_skipped:
+                            on_skipped(channel)
+                        return
+
+                    started = False
+
+                    def probe_function():
+                        nonlocal started
+                        started = True
+                        return probe_host(host, channel.url)
+
+                    try:
+                        cached = await probe_cache.probe_async(channel.url, probe_function)
+                    finally:
+                        if not started:
+                            # The URL was already being probed elsewhere, give back what allow() granted
+                            self.host_guard.record(host, None)
+                # The time of the actual probe is reported, so a reused result is not recorded twice
+                on_result(channel, *cached)
+                probed += 1
+            except Exception as e:
+                errors.append(e)
+            finally:
+                queued.release()
+
+        async def host_worker(host, queue):
+            try:
+                while queue:
+                    await probe(host, queue.popleft())
+            finally:
+                host_workers[host] -= 1
+                if not host_workers[host]:
+                    del host_workers[host]
+                    del host_queues[host]
+
+        def start(coroutine):
+            task = asyncio.create_task(coroutine)
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        resolver = CachingResolver()
+        connector = aiohttp.TCPConnector(
+            limit=self.max_concurrency, limit_per_host=self.per_host_limit, resolver=resolver,
+            use_dns_cache=False  # The resolver has its own cache, shared by every sweep
+        )
+        async with aiohttp.ClientSession(
+            connector=connector, timeout=probe_client_timeout(self.timeout),
+            trace_configs=[probe_trace_config()]
+        ) as session:
+            try:
+                for channel in channels:
+                    await queued.acquire()
+                    if errors:
+                        # A result couldn't be handled (e.g. database error), stop the sweep
+                        break
+
+                    host = url_host(channel.url)
+                    queue = host_queues.get(host)
+                    if queue is None:
+                        queue = host_queues[host] = deque()
+                        resolver.prefetch(host)
+                    queue.append(channel)
+
+                    # Every worker of the host is busy with a probe, add one if the limit allows it
+                    if host_workers.get(host, 0) < self.per_host_limit:
+                        host_workers[host] = host_workers.get(host, 0) + 1
+                        start(host_worker(host, queue))
+
+                await asyncio.gather(*tasks)
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+        if errors:
+            raise errors[0]
+        return probed
+
+
+async def tune_channels_async(channels=None, progress_callback=None, engine=None, quiet=False):
+    """
+    Asynchronous version of tune_channels(), see it for the parameters.
+    :param engine: Optional TuningEngine doing the probes (a default one is created when omitted).
+    """
+    if channels is None:
+        total_channels = Channel.count_channels()
+        channels = Channel.iter_channels()
+    else:
+        channels = list(channels)
+        total_channels = len(channels)
+
+    engine = engine or TuningEngine()
+    log_progress = logger.debug if quiet else logger.info
+    done = 0
+    last_progress = -1
+
+    # The results are written in batched transactions by the thread of the writer, so the probes in flight
+    # never wait for the database
+    with TunedStatusWriter(background=True) as writer:
+        def advance():
+            # Report the progress each time the percentage changes
+            nonlocal done, last_progress
+            done += 1
+            progress = int(done / max(total_channels, done) * 100)
+            if progress != last_progress:
+                last_progress = progress
+                if progress_callback:
+                    progress_callback(progress)
+                log_progress(f"Processed {done} out of {total_channels} channels ({progress}%)")
+
+        def on_result(channel, result, checked_at):
+            writer.add(channel.id, result, checked_at)
+            advance()
+
+        def on_skipped(channel):
+            writer.add_unreachable(channel.id)
+            advance()
+
+        return await engine.run(channels, on_result, on_skipped)
+
+
+def tune_channels(channels=None, progress_callback=None, engine=None, quiet=False):
+    """
+    Probes the channels and updates their 'tuned' status. Used by the tuning thread of the
+    interface and by the command line, it doesn't depend on Qt.
+
+    Runs its own event loop, so it must be called from a thread without one.
+
+    :param channels: Channels to tune. When omitted, every channel in the database is
+                     streamed from it instead of being loaded up front.
+    :param progress_callback: Optional callable receiving the progress (0-100) when it changes.
+    :param engine: Optional TuningEngine doing the probes (a default one is created when omitted).
+    :param quiet: Log the progress at the debug level, for the rounds of the background tuning.
+    :return: The number of channels probed (channels of hosts whose circuit is open are skipped and
+             marked as not working).
+    """
+    return asyncio.run(tune_channels_async(channels, progress_callback, engine, quiet))
@@ -0,0 +1,127 @@
+import heapq
+import math
+import time
+from collections import namedtuple
+from operator import attrgetter
+
+from iptv.config.logger import logger
+from iptv.controllers.tuning import TuningEngine, tune_channels
+from iptv.models.database.probe_history import ProbeHistory
+
+# Probes per minute of the background tuning
+BUDGET_PER_MINUTE = 60
+# Seconds between two rounds of probes, the budget of a minute is spread over its rounds
+TICK_INTERVAL = 10
+# Seconds between two rebuilds of the queue of due channels (each one reads every channel)
+QUEUE_REFRESH = 300
+
+# Target time in seconds between two probes of a channel nobody watches
+BASE_INTERVAL = 6 * 3600
+# Favorite channels are probed this many times more often
+FAVORITE_FACTOR = 4
+# Channels watched in this window (seconds) are probed twice as often
+RECENT_VIEW_WINDOW = 24 * 3600
+# Channels that failed up to this many probes in a row are probed twice as often, to confirm the outage
+RECENT_FAILURES = 2
+# Channels that kept failing afterwards are probed less and less often, down to this factor
+MAX_BACKOFF = 16
+# Channels whose priority reaches this value are due for a probe
+DUE_PRIORITY = 1.0
+
+# A channel picked by the scheduler, the tuning engine only needs its ID and URL
+TuningCandidate = namedtuple("TuningCandidate", ["id", "url", "priority"])
+
+
+def tuning_priority(now, checked_at, favorite, view_count, last_viewed_at, consecutive_failures):
+    """
+    Priority of a channel for the background tuning: the time since its last probe divided by the time
+    it should wait between probes, so a channel is due when its priority reaches 1.
+
+    The wait is shorter for favorite, often or recently watched channels and channels that just started
+    failing, and grows for channels that keep failing. Never probed channels come before everything else.
+    """
+    interval = BASE_INTERVAL
+    if favorite:
+        interval /= FAVORITE_FACTOR
+    interval /= 1 + math.log2(1 + view_count)
+    if last_viewed_at and now - last_viewed_at < RECENT_VIEW_WINDOW:
+        interval /= 2
+
+    if 0 < consecutive_failures <= RECENT_FAILURES:
+        interval /= 2
+    elif consecutive_failures > RECENT_FAILURES:
+        interval *= min(2 ** (consecutive_failures - RECENT_FAILURES), MAX_BACKOFF)
+
+    return (now - (checked_at or 0)) / interval
+
+
+class TuningScheduler:
+    """
+    Keeps the tuned status of the channels fresh by probing, every few seconds, the few channels that
+    need it the most (see tuning_priority()), instead of sweeping the whole list at once.
+
+    The most urgent channels are queued for the next QUEUE_REFRESH seconds, so the whole list is only
+    read once per refresh rather than on every round.
+
+    Doesn't depend on Qt: TuningSchedulerThread runs it in the interface, the command line with 'tune --schedule'.
+    """
+
+    def __init__(self, budget_per_minute=BUDGET_PER_MINUTE, tick_interval=TICK_INTERVAL):
+        self.tick_interval = tick_interval
+        self.budget_per_tick = max(1, round(budget_per_minute * tick_interval / 60))
+        self._queue = []  # Due channels, the most urgent last
+        self._queue_built_at = None
+
+    def rebuild_queue(self, now=None):
+        """ Queues the most urgent due channels, as many as the rounds until the next rebuild can probe. """
+        now = now if now is not None else time.time()
+        size = self.budget_per_tick * max(1, math.ceil(QUEUE_REFRESH / self.tick_interval))
+
+        candidates = (
+            TuningCandidate(channel_id, url, tuning_priority(now, *factors))
+            for channel_id, url, *factors in ProbeHistory.iter_tuning_candidates()
+        )
+        due = (candidate for candidate in candidates if candidate.priority >= DUE_PRIORITY)
+        self._queue = heapq.nlargest(size, due, key=attrgetter("priority"))
+        self._queue.reverse()
+        self._queue_built_at = time.monotonic()
+
+    def due_channels(self):
+        """ Takes the channels to probe in the next round from the queue, the most urgent first. """
+        if self._queue_built_at is None or time.monotonic() - self._queue_built_at >= QUEUE_REFRESH:
+            self.rebuild_queue()
+
+        channels = self._queue[-self.budget_per_tick:][::-1]
+        del self._queue[-self.budget_per_tick:]
+        return channels
+
+    def tick(self):
+        """ Runs a round of probes, returning the number of channels probed. """
+        channels = self.due_channels()
+        if not channels:
+            return 0
+        # A summary of each round is logged instead of the progress of its probes
+        return tune_channels(channels, engine=TuningEngine(max_concurrency=len(channels)), quiet=True)
+
+    def run(self, stop_event):
+        """
+        Runs rounds of probes until the event is set.
+        :param stop_event: A threading.Event, also used to wait between rounds so stopping is immediate.
+        """
+        logger.info(f"Background tuning started ({self.budget_per_tick} channels every {self.tick_interval}s)")
+
+        while not stop_event.is_set():
+            started = time.monotonic()
+            try:
+                probed = self.tick()
+                if probed:
+                    logger.info(
+                        f"Background tuning probed {probed} channels in {time.monotonic() - started:.1f}s"
+                    )
+            except Exception as e:
+                # A failed round (e.g. the database is locked) doesn't stop the next ones
+                logger.error(f"Error in the background tuning: {e}")
+
+            stop_event.wait(max(0.0, self.tick_interval - (time.monotonic() - started)))
+
+        logger.info("Background tuning stopped")
@@ -19,7 +19,7 @@ class ChannelManager:
         """ Get the loaded channels, or load them if not loaded yet """
         if self._channels is None:
             logger.info("Loading channels from database...")
-            self._channels = Channel.get_all_channels()
+            self._channels = Channel.get_channel_listing()
         return self._channels
 
     def refresh(self):
@@ -46,6 +46,7 @@ class ChannelManager:
 
         if channel:
             self._current_channel = channel
+            Channel.record_view(channel.id)
         else:
             self._current_channel = None
 
@@ -1,13 +1,28 @@
 import json
+import re
+import time
 
-from .connection import create_connection
+from .connection import database_lock, get_connection, transaction
+from .migrations import TYPED_ATTRIBUTES, migrate
+from ..url import canonical_url
 from ...config.logger import logger
+from ...config.settings import get_database_path
 
-# Global variable for database path
-DATABASE_PATH = "iptv.db"
+
+# Columns read to build a full Channel object, in constructor order
+CHANNEL_COLUMNS = "id, name, url, duration, attributes, extras"
+
+# Columns of the rows built by Channel.to_insert_row(), in order
+INSERT_COLUMNS = (
+    ("name", "url", "canonical_url", "duration", "attributes", "extras")
+    + tuple(column for _, column in TYPED_ATTRIBUTES)
+)
 
 
 class Channel:
+    # Slots keep each instance small when hundreds of thousands of channels are loaded
+    __slots__ = ("id", "name", "url", "duration", "_attributes", "_extras")
+
     def __init__(self, id, name, url, duration, attributes=None, extras=None):
         """
         Simplified constructor that only handles the necessary fields:
@@ -15,15 +30,39 @@ class Channel:
         - name (str): Name of the channel.
         - url (str): URL of the channel (e.g., .m3u8 format).
         - duration (str): Duration of the channel (e.g., "-1").
-        - attributes (dict): Additional attributes in dictionary format.
-        - extras (list): List of additional options (e.g., specific VLC settings).
+        - attributes (dict): Additional attributes in dictionary format, or its raw JSON string.
+        - extras (list): List of additional options (e.g., specific VLC settings), or its raw JSON string.
+
+        Raw JSON strings are only decoded the first time the field is accessed.
         """
         self.id = id
         self.name = name
         self.url = url
         self.duration = duration
-        self.attributes = attributes or {}
-        self.extras = extras or []
+        self._attributes = attributes
+        self._extras = extras
+
+    @property
+    def attributes(self):
+        """ Additional attributes of the channel, decoded on first access. """
+        if not isinstance(self._attributes, dict):
+            self._attributes = json.loads(self._attributes) if self._attributes else {}
+        return self._attributes
+
+    @attributes.setter
+    def attributes(self, value):
+        self._attributes = value
+
+    @property
+    def extras(self):
+        """ Additional options of the channel, decoded on first access. """
+        if not isinstance(self._extras, list):
+            self._extras = json.loads(self._extras) if self._extras else []
+        return self._extras
+
+    @extras.setter
+    def extras(self, value):
+        self._extras = value
 
     def __repr__(self):
         return f"<Channel(id={self.id}, name={self.name}, url={self.url}, attributes={self.attributes}, extras={self.extras})>"
@@ -32,7 +71,7 @@ class Channel:
         """ Converts the channel to a dictionary in the required JSON format. """
         return {
             "name": self.name,
-            "duration": str(self.duration),
+            "duration": str(self.duration) if self.duration is not None else None,
             "url": self.url,
             "attributes": self.attributes,
             "extras": self.extras
@@ -40,31 +79,33 @@ class Channel:
 
     @staticmethod
     def _execute_query(query, params=(), fetch=False):
-        """ Helper method to manage database connections and execute queries. """
-        with create_connection(DATABASE_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute(query, params)
+        """
+        Helper method to execute queries on the persistent connection of the current thread.
+        Outside of an explicit transaction every statement is committed on its own.
+        """
+        database_path = get_database_path()
+        with database_lock(database_path):
+            cursor = get_connection(database_path).execute(query, params)
             if fetch:
                 return cursor.fetchall()
-            conn.commit()
+
+    @staticmethod
+    def transaction():
+        """
+        Context manager grouping every query executed inside it into a single commit:
+
+            with Channel.transaction():
+                Channel.update_channel(...)
+                Channel.delete_channel(...)
+        """
+        return transaction(get_database_path())
 
     @staticmethod
     def create_table():
-        """ Creates the channels table in the database if it doesn't exist. """
-        sql_query = """
-            CREATE TABLE IF NOT EXISTS channels (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                url TEXT NOT NULL,
-                duration TEXT,
-                attributes TEXT,
-                extras TEXT,
-                tuned BOOLEAN DEFAULT 1,
-                favorite BOOLEAN DEFAULT 0,
-                last BOOLEAN DEFAULT 0
-            )
-        """
-        Channel._execute_query(sql_query)
+        """ Creates the channels table if it doesn't exist and upgrades the schema to the latest version. """
+        database_path = get_database_path()
+        with database_lock(database_path):
+            migrate(get_connection(database_path))
 
     @staticmethod
     def insert_channel(channel_data):
@@ -73,12 +114,17 @@ class Channel:
         """
         if isinstance(channel_data, dict):
             fields = channel_data
+        elif isinstance(channel_data, Channel):
+            fields = channel_data.to_dict()
         elif hasattr(channel_data, '__dict__'):
             fields = vars(channel_data)
         else:
             raise TypeError("Provided data must be either a dictionary or an object with attributes.")
 
         filtered_fields = {k: v for k, v in fields.items() if v is not None}
+        filtered_fields.update(Channel._typed_attribute_fields(filtered_fields.get("attributes")))
+        if "url" in filtered_fields:
+            filtered_fields["canonical_url"] = canonical_url(filtered_fields["url"])
         Channel._serialize_json_fields(filtered_fields)
 
         columns = ', '.join(filtered_fields.keys())
@@ -88,6 +134,92 @@ class Channel:
         sql_query = f"INSERT INTO channels ({columns}) VALUES ({placeholders})"
         Channel._execute_query(sql_query, values)
 
+    @staticmethod
+    def insert_channels_bulk(channels):
+        """
+        Inserts many channels in a single transaction, skipping the ones whose URL (or canonical URL)
+        is already stored.
+        Accepts any iterable of dictionaries or objects with attributes (e.g. ipytv channels).
+
+        :return: A tuple (inserted, skipped) with the number of rows inserted and ignored.
+        """
+        return Channel.insert_rows_bulk(filter(None, map(Channel.to_insert_row, channels)))
+
+    @staticmethod
+    def insert_rows_bulk(rows):
+        """
+        Same as insert_channels_bulk() for rows already built by Channel.to_insert_row().
+
+        :return: A tuple (inserted, skipped) with the number of rows inserted and ignored.
+        """
+        rows = list(rows)
+        if not rows:
+            return 0, 0
+
+        sql_query = f"""
+            INSERT OR IGNORE INTO channels ({", ".join(INSERT_COLUMNS)})
+            VALUES ({", ".join(["?"] * len(INSERT_COLUMNS))})
+        """
+        with Channel.transaction() as conn:
+            # rowcount only counts the rows of the statement itself, not the ones written by triggers
+            inserted = conn.executemany(sql_query, rows).rowcount
+
+        return inserted, len(rows) - inserted
+
+    @staticmethod
+    def to_insert_row(channel_data):
+        """
+        Converts a channel dictionary or object into a row of INSERT_COLUMNS values,
+        with the JSON fields serialized, or None if it has no URL.
+        """
+        if isinstance(channel_data, dict):
+            fields = channel_data
+        elif isinstance(channel_data, Channel):
+            fields = channel_data.to_dict()
+        elif hasattr(channel_data, '__dict__'):
+            fields = vars(channel_data)
+        else:
+            raise TypeError("Provided data must be either a dictionary or an object with attributes.")
+
+        url = fields.get("url")
+        if not url:
+            return None
+
+        attributes = fields.get("attributes")
+        extras = fields.get("extras")
+        duration = fields.get("duration")
+
+        return (
+            fields.get("name") or url,
+            url,
+            canonical_url(url),
+            str(duration) if duration is not None else None,
+            json.dumps(attributes) if isinstance(attributes, dict) else attributes,
+            json.dumps(extras) if isinstance(extras, list) else extras,
+            *Channel._typed_attribute_fields(attributes).values()
+        )
+
+    @staticmethod
+    def _typed_attribute_fields(attributes):
+        """
+        Extracts the TYPED_ATTRIBUTES of a channel into a dictionary {column: value},
+        with None for the missing or empty ones.
+        :param attributes: The attributes dictionary, or its JSON string.
+        """
+        if isinstance(attributes, str):
+            try:
+                attributes = json.loads(attributes)
+            except ValueError:
+                attributes = None
+        if not isinstance(attributes, dict):
+            attributes = {}
+
+        fields = {}
+        for attribute, column in TYPED_ATTRIBUTES:
+            value = attributes.get(attribute)
+            fields[column] = str(value) if value not in (None, "") else None
+        return fields
+
     @staticmethod
     def _serialize_json_fields(fields):
         """ Serializes 'attributes' and 'extras' fields if they are in the provided dictionary. """
@@ -97,47 +229,192 @@ class Channel:
 
     @staticmethod
     def _deserialize_json_fields(row):
-        """ Deserializes 'attributes' and 'extras' fields from JSON strings. """
-        return Channel(
-            id=row[0],
-            name=row[1],
-            url=row[2],
-            duration=row[3],
-            attributes=json.loads(row[4]) if row[4] else {},
-            extras=json.loads(row[5]) if row[5] else []
-        )
+        """
+        Builds a Channel from a row selected with CHANNEL_COLUMNS.
+        The 'attributes' and 'extras' JSON strings are kept raw and decoded lazily.
+        """
+        return Channel(*row)
 
     @staticmethod
     def get_all_channels():
         """ Retrieves all channels from the database that are marked as 'tuned' (tuned = 1). """
-        sql_query = "SELECT * FROM channels WHERE tuned = 1 ORDER BY name ASC"
+        sql_query = f"SELECT {CHANNEL_COLUMNS} FROM channels WHERE tuned = 1 ORDER BY name ASC"
         rows = Channel._execute_query(sql_query, fetch=True)
 
         return [Channel._deserialize_json_fields(row) for row in rows]
 
+    @staticmethod
+    def get_channel_listing():
+        """
+        Retrieves the 'tuned' channels with only their id, name and URL, ordered by name.
+        Lightweight variant of get_all_channels() for list views, served entirely from an index.
+        """
+        sql_query = "SELECT id, name, url FROM channels WHERE tuned = 1 ORDER BY name ASC"
+        rows = Channel._execute_query(sql_query, fetch=True)
+
+        return [Channel(id, name, url, None) for id, name, url in rows]
+
     @staticmethod
     def get_all_channels_without_filters():
         """ Retrieves all channels from the database. """
-        sql_query = "SELECT * FROM channels"
+        sql_query = f"SELECT {CHANNEL_COLUMNS} FROM channels"
         rows = Channel._execute_query(sql_query, fetch=True)
 
         return [Channel._deserialize_json_fields(row) for row in rows]
 
+    @staticmethod
+    def count_channels(tuned=None):
+        """
+        Counts the channels in the database.
+        :param tuned: If True or False, only counts the channels with that 'tuned' status.
+        """
+        if tuned is None:
+            rows = Channel._execute_query("SELECT COUNT(*) FROM channels", fetch=True)
+        else:
+            rows = Channel._execute_query("SELECT COUNT(*) FROM channels WHERE tuned = ?", (int(tuned),), fetch=True)
+        return rows[0][0]
+
+    @staticmethod
+    def page(after_id=0, limit=500, tuned=None):
+        """
+        Retrieves one page of channels ordered by ID using keyset pagination.
+        Pass the ID of the last channel of a page as 'after_id' to get the next one.
+
+        :param after_id: Only channels with a greater ID are returned.
+        :param limit: Maximum number of channels in the page.
+        :param tuned: If True or False, only returns the channels with that 'tuned' status.
+        """
+        if tuned is None:
+            sql_query = f"SELECT {CHANNEL_COLUMNS} FROM channels WHERE id > ? ORDER BY id LIMIT ?"
+            params = (after_id, limit)
+        else:
+            sql_query = f"SELECT {CHANNEL_COLUMNS} FROM channels WHERE id > ? AND tuned = ? ORDER BY id LIMIT ?"
+            params = (after_id, int(tuned), limit)
+        rows = Channel._execute_query(sql_query, params, fetch=True)
+
+        return [Channel._deserialize_json_fields(row) for row in rows]
+
+    @staticmethod
+    def iter_channels(tuned=None, batch_size=500):
+        """
+        Generator yielding every channel ordered by ID, reading 'batch_size' rows at a time.
+        Only one page is held in memory, and no read transaction stays open between pages,
+        so the rows can be updated while iterating.
+
+        :param tuned: If True or False, only yields the channels with that 'tuned' status.
+        :param batch_size: Number of rows read from the database per query.
+        """
+        after_id = 0
+        while True:
+            channels = Channel.page(after_id, batch_size, tuned)
+            yield from channels
+
+            if len(channels) < batch_size:
+                return
+            after_id = channels[-1].id
+
+    @staticmethod
+    def search(query, limit=50, tuned=None):
+        """
+        Full-text search over the channel names and their group, tvg-id, tvg-name and country attributes.
+        Every word of the query matches as a prefix ("espn spo" finds "ESPN Sports"), and the
+        results are ranked by relevance with name matches weighted the highest.
+
+        :param query: Text typed by the user.
+        :param limit: Maximum number of channels returned.
+        :param tuned: If True or False, only returns the channels with that 'tuned' status.
+        """
+        words = re.findall(r"\w+", query)
+        if not words:
+            return []
+
+        # Quote every word so FTS5 operators typed by the user are matched literally
+        match_expression = " ".join(f'"{word}"*' for word in words)
+        columns = ", ".join(f"c.{column.strip()}" for column in CHANNEL_COLUMNS.split(","))
+        tuned_clause = "" if tuned is None else "AND c.tuned = ?"
+
+        sql_query = f"""
+            SELECT {columns}
+            FROM channels_fts
+            JOIN channels c ON c.id = channels_fts.rowid
+            WHERE channels_fts MATCH ? {tuned_clause}
+            ORDER BY bm25(channels_fts, 10.0, 2.0, 2.0, 5.0, 1.0)
+            LIMIT ?
+        """
+        params = (match_expression,) + (() if tuned is None else (int(tuned),)) + (limit,)
+        rows = Channel._execute_query(sql_query, params, fetch=True)
+
+        return [Channel._deserialize_json_fields(row) for row in rows]
+
+    @staticmethod
+    def get_groups(tuned=None):
+        """
+        Retrieves the groups (group-title attribute) of the channels with their number of channels,
+        ordered by name. Channels without a group are counted under None.
+        :param tuned: If True or False, only counts the channels with that 'tuned' status.
+        """
+        if tuned is None:
+            sql_query = "SELECT group_title, COUNT(*) FROM channels GROUP BY group_title ORDER BY group_title"
+            params = ()
+        else:
+            sql_query = """
+                SELECT group_title, COUNT(*) FROM channels
+                WHERE tuned = ?
+                GROUP BY group_title ORDER BY group_title
+            """
+            params = (int(tuned),)
+        return Channel._execute_query(sql_query, params, fetch=True)
+
+    @staticmethod
+    def get_channels_by_group(group_title, tuned=None):
+        """
+        Retrieves the channels of a group ordered by name.
+        :param tuned: If True or False, only returns the channels with that 'tuned' status.
+        """
+        if tuned is None:
+            sql_query = f"SELECT {CHANNEL_COLUMNS} FROM channels WHERE group_title IS ? ORDER BY name"
+            params = (group_title,)
+        else:
+            sql_query = f"SELECT {CHANNEL_COLUMNS} FROM channels WHERE group_title IS ? AND tuned = ? ORDER BY name"
+            params = (group_title, int(tuned))
+        rows = Channel._execute_query(sql_query, params, fetch=True)
+
+        return [Channel._deserialize_json_fields(row) for row in rows]
+
+    @staticmethod
+    def get_channels_by_tvg_id(tvg_id):
+        """ Retrieves the channels matching an EPG identifier (tvg-id attribute). """
+        sql_query = f"SELECT {CHANNEL_COLUMNS} FROM channels WHERE tvg_id = ? ORDER BY id"
+        rows = Channel._execute_query(sql_query, (tvg_id,), fetch=True)
+
+        return [Channel._deserialize_json_fields(row) for row in rows]
+
     @staticmethod
     def get_channel_by_id(channel_id):
         """ Retrieves a channel by its ID. """
-        sql_query = "SELECT * FROM channels WHERE id=?"
+        sql_query = f"SELECT {CHANNEL_COLUMNS} FROM channels WHERE id=?"
         row = Channel._execute_query(sql_query, (channel_id,), fetch=True)
 
         if row:
             return Channel._deserialize_json_fields(row[0])
         return None
 
+    @staticmethod
+    def get_canonical_urls():
+        """
+        Loads the canonical URLs of every stored channel into a set, read straight from its index.
+        Lets an import drop the entries already stored without querying the database for each of them.
+        """
+        database_path = get_database_path()
+        with database_lock(database_path):
+            cursor = get_connection(database_path).execute("SELECT canonical_url FROM channels")
+            return {canonical for (canonical,) in cursor}
+
     @staticmethod
     def get_channel_by_url(channel_url):
-        """ Retrieves a channel by its URL. """
-        sql_query = "SELECT * FROM channels WHERE url=?"
-        row = Channel._execute_query(sql_query, (channel_url,), fetch=True)
+        """ Retrieves a channel by its URL, matching trivially different forms of it (see canonical_url). """
+        sql_query = f"SELECT {CHANNEL_COLUMNS} FROM channels WHERE canonical_url=?"
+        row = Channel._execute_query(sql_query, (canonical_url(channel_url),), fetch=True)
 
         if row:
             return Channel._deserialize_json_fields(row[0])
@@ -150,12 +427,44 @@ class Channel:
             logger.error("Error: The update_data parameter must be a non-empty dictionary.")
             return
 
+        if "attributes" in update_data:
+            # Keep the attribute columns in sync with the JSON
+            update_data = {**update_data, **Channel._typed_attribute_fields(update_data["attributes"])}
+            Channel._serialize_json_fields(update_data)
+        if "url" in update_data:
+            update_data = {**update_data, "canonical_url": canonical_url(update_data["url"])}
+
         set_clause = ", ".join([f"{field} = ?" for field in update_data])
         values = list(update_data.values()) + [channel_id]
 
         sql_query = f"UPDATE channels SET {set_clause} WHERE id = ?"
         Channel._execute_query(sql_query, tuple(values))
 
+    @staticmethod
+    def update_tuned_bulk(results):
+        """
+        Updates the 'tuned' status of many channels in a single transaction.
+
+        :param results: Iterable of (channel_id, tuned, checked_at) tuples, where 'checked_at'
+                        is the UNIX timestamp of the check.
+        :return: The number of channels updated.
+        """
+        rows = [(int(bool(tuned)), checked_at, channel_id) for channel_id, tuned, checked_at in results]
+        if not rows:
+            return 0
+
+        sql_query = "UPDATE channels SET tuned = ?, checked_at = ? WHERE id = ?"
+        with Channel.transaction() as conn:
+            conn.executemany(sql_query, rows)
+
+        return len(rows)
+
+    @staticmethod
+    def record_view(channel_id, viewed_at=None):
+        """ Counts a playback of a channel, the most watched channels are tuned more often. """
+        sql_query = "UPDATE channels SET view_count = view_count + 1, last_viewed_at = ? WHERE id = ?"
+        Channel._execute_query(sql_query, (viewed_at if viewed_at is not None else time.time(), channel_id))
+
     @staticmethod
     def delete_channel(channel_id):
         """ Deletes a channel from the database by its ID. """
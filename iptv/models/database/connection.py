@@ -1,22 +1,155 @@
+import os
 import sqlite3
-from sqlite3 import Error
+import threading
+from contextlib import contextmanager, nullcontext
 
 from iptv.config.logger import logger
 
+# Pragmas applied to every connection opened by the connection manager
+CONNECTION_PRAGMAS = (
+    "PRAGMA cache_size = -20000",  # ~20 MB page cache
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA foreign_keys = ON",
+)
 
-def create_connection(db_file):
-    """ Create a connection to the database """
-    conn = None
-    try:
-        conn = sqlite3.connect(db_file)
-        logger.info(f"Create a connection to the database")
-    except Error as e:
-        logger.error(f"Error while connecting to the database: {e}")
+# Pragmas only meaningful for databases stored in a file
+FILE_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",  # Readers never block the writer (and vice versa)
+    "PRAGMA synchronous = NORMAL",  # Safe with WAL, avoids an fsync per commit
+    "PRAGMA mmap_size = 268435456",  # Memory-map up to 256 MB of the database file
+)
+
+# A plain ':memory:' database is private to its connection, so it is mapped to a named
+# shared-cache database to be visible from every thread of the process
+SHARED_MEMORY_URI = "file:neo-iptv-memory?mode=memory&cache=shared"
+
+# Seconds to wait for a lock held by another connection before failing
+BUSY_TIMEOUT = 30
+
+# Connections kept open for the lifetime of each thread (one per database file)
+_local = threading.local()
+
+# One connection kept open per in-memory database, so its content survives the threads using it
+_memory_keepers = {}
+_memory_keepers_lock = threading.Lock()
+
+# The connections to an in-memory database share its cache, whose table locks fail at once (SQLITE_LOCKED)
+# instead of waiting for the busy timeout, so their statements and transactions are run one at a time
+_memory_lock = threading.RLock()
+
+
+def _thread_state():
+    """ Get the per-thread connection registry, creating it on first use """
+    if not hasattr(_local, "connections"):
+        _local.connections = {}
+        _local.depth = {}
+    return _local
+
+
+def is_memory_database(db_file):
+    """ Check whether the database location points to an in-memory database """
+    return db_file == ":memory:" or db_file.startswith("file::memory:") or "mode=memory" in db_file
+
+
+def _connect(db_file):
+    """ Connect to a file path, ':memory:' or an SQLite URI ('file:...') in autocommit mode """
+    if db_file == ":memory:":
+        db_file = SHARED_MEMORY_URI
+
+    is_uri = db_file.startswith("file:")
+    if not is_uri:
+        directory = os.path.dirname(db_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    return sqlite3.connect(db_file, timeout=BUSY_TIMEOUT, isolation_level=None, uri=is_uri)
+
+
+def _open_connection(db_file):
+    """ Open a tuned connection in autocommit mode (transactions are explicit) """
+    if is_memory_database(db_file):
+        with _memory_keepers_lock:
+            if db_file not in _memory_keepers:
+                _memory_keepers[db_file] = _connect(db_file)
+        pragmas = CONNECTION_PRAGMAS
+    else:
+        pragmas = CONNECTION_PRAGMAS + FILE_PRAGMAS
+
+    conn = _connect(db_file)
+    for pragma in pragmas:
+        conn.execute(pragma)
+    logger.debug(f"Opened a persistent connection to the database for thread {threading.current_thread().name}")
+    return conn
+
+
+def get_connection(db_file):
+    """
+    Get the persistent connection of the current thread for the given database file.
+    The connection is opened on first use and reused by every later query of the thread.
+    """
+    state = _thread_state()
+    conn = state.connections.get(db_file)
+    if conn is None:
+        conn = _open_connection(db_file)
+        state.connections[db_file] = conn
+        state.depth[db_file] = 0
     return conn
 
 
-def close_connection(conn):
-    """ Close the connection to the database """
-    if conn:
+def database_lock(db_file):
+    """
+    Context manager to hold while running statements on a database: the process-wide lock of the
+    in-memory databases, nothing for database files (their locks wait for each other).
+    Reentrant, so statements run inside a transaction() don't wait for themselves.
+    """
+    return _memory_lock if is_memory_database(db_file) else nullcontext()
+
+
+def in_transaction(db_file):
+    """ Check whether the current thread has an explicit transaction open on the database """
+    state = _thread_state()
+    return state.depth.get(db_file, 0) > 0
+
+
+@contextmanager
+def transaction(db_file):
+    """
+    Group every statement executed by the current thread into a single commit.
+    Nested blocks join the outermost transaction, which commits on success and rolls back on error.
+    """
+    conn = get_connection(db_file)
+    state = _thread_state()
+
+    with database_lock(db_file):
+        if state.depth[db_file] == 0:
+            conn.execute("BEGIN IMMEDIATE")
+
+        state.depth[db_file] += 1
+        try:
+            yield conn
+        except BaseException:
+            state.depth[db_file] -= 1
+            if state.depth[db_file] == 0:
+                conn.execute("ROLLBACK")
+            raise
+        else:
+            state.depth[db_file] -= 1
+            if state.depth[db_file] == 0:
+                conn.execute("COMMIT")
+
+
+def close_thread_connections():
+    """ Close every connection opened by the current thread (call it before a worker thread exits) """
+    state = _thread_state()
+    for conn in state.connections.values():
         conn.close()
-        logger.info(f"Closed the connection to the database")
+    state.connections.clear()
+    state.depth.clear()
+
+
+def drop_memory_database(db_file):
+    """ Release an in-memory database once every thread has closed its connection to it """
+    with _memory_keepers_lock:
+        keeper = _memory_keepers.pop(db_file, None)
+    if keeper:
+        keeper.close()
@@ -0,0 +1,52 @@
+import time
+
+from .channel import Channel
+
+
+class ImportCheckpoint:
+    __slots__ = ("source", "byte_offset", "entry_index", "content_hash", "updated_at")
+
+    def __init__(self, source, byte_offset, entry_index, content_hash, updated_at=None):
+        """
+        How far an interrupted import went:
+        - source (str): Path or URL of the playlist.
+        - byte_offset (int): Bytes of the playlist covered by the committed batches (always at an entry boundary).
+        - entry_index (int): Entries of the playlist covered by the committed batches.
+        - content_hash (str): SHA-256 of the first 'byte_offset' bytes, to check the playlist wasn't modified.
+        - updated_at (float): UNIX timestamp of the last committed batch.
+        """
+        self.source = source
+        self.byte_offset = byte_offset
+        self.entry_index = entry_index
+        self.content_hash = content_hash
+        self.updated_at = updated_at
+
+    def __repr__(self):
+        return f"<ImportCheckpoint(source={self.source}, offset={self.byte_offset}, entries={self.entry_index})>"
+
+    @staticmethod
+    def get(source):
+        """ Retrieves the checkpoint of an interrupted import of the source, or None. """
+        sql_query = f"SELECT {', '.join(ImportCheckpoint.__slots__)} FROM import_checkpoints WHERE source = ?"
+        row = Channel._execute_query(sql_query, (source,), fetch=True)
+
+        if row:
+            return ImportCheckpoint(*row[0])
+        return None
+
+    @staticmethod
+    def save(source, byte_offset, entry_index, content_hash):
+        """
+        Records how far the import of a source went.
+        Call it inside the transaction writing the batch, so the checkpoint never gets ahead of the data.
+        """
+        sql_query = """
+            INSERT OR REPLACE INTO import_checkpoints (source, byte_offset, entry_index, content_hash, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+        """
+        Channel._execute_query(sql_query, (source, byte_offset, entry_index, content_hash, time.time()))
+
+    @staticmethod
+    def delete(source):
+        """ Forgets the checkpoint of a source (its import is complete, or can't be resumed). """
+        Channel._execute_query("DELETE FROM import_checkpoints WHERE source = ?", (source,))
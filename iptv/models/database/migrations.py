@@ -0,0 +1,296 @@
+from iptv.config.logger import logger
+from iptv.models.url import canonical_url
+
+
+def _create_channels_table(conn):
+    """ Creates the channels table (databases created before migrations already have it). """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS channels (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            url TEXT NOT NULL,
+            duration TEXT,
+            attributes TEXT,
+            extras TEXT,
+            tuned BOOLEAN DEFAULT 1,
+            favorite BOOLEAN DEFAULT 0,
+            last BOOLEAN DEFAULT 0
+        )
+    """)
+
+
+def _unique_channel_urls(conn):
+    """ Drops duplicated URLs left by older versions and enforces URL uniqueness. """
+    # Keep the favorite channel, otherwise the last watched one, otherwise the oldest one
+    conn.execute("""
+        DELETE FROM channels
+        WHERE id NOT IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY url ORDER BY favorite DESC, last DESC, id
+                ) AS position
+                FROM channels
+            )
+            WHERE position = 1
+        )
+    """)
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_channels_url ON channels (url)")
+
+
+def _channel_query_indexes(conn):
+    """ Adds the indexes used by the playlist queries (tuned filter ordered by name, favorites, last). """
+    # Covers "WHERE tuned = 1 ORDER BY name" and the name/url listing without touching the table
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_channels_tuned_name ON channels (tuned, name, url)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_channels_favorite ON channels (name) WHERE favorite = 1")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_channels_last ON channels (id) WHERE last = 1")
+
+
+def _json_attribute(row, key):
+    """ SQL expression reading an EXTINF attribute from the JSON 'attributes' column of a trigger row. """
+    return f"CASE WHEN json_valid({row}.attributes) THEN json_extract({row}.attributes, '$.\"{key}\"') END"
+
+
+# EXTINF attributes indexed for full-text search, in channels_fts column order (after 'name')
+FTS_ATTRIBUTES = ("group-title", "tvg-id", "tvg-name", "tvg-country")
+
+
+def _channels_full_text_search(conn):
+    """ Adds the FTS5 index over channel names and searchable attributes, kept in sync by triggers. """
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS channels_fts USING fts5(
+            name, group_title, tvg_id, tvg_name, country,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    """)
+
+    new_values = ", ".join(["new.name"] + [_json_attribute("new", key) for key in FTS_ATTRIBUTES])
+    insert_new = f"INSERT INTO channels_fts (rowid, name, group_title, tvg_id, tvg_name, country) VALUES (new.id, {new_values});"
+
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS channels_fts_insert AFTER INSERT ON channels BEGIN
+            {insert_new}
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS channels_fts_delete AFTER DELETE ON channels BEGIN
+            DELETE FROM channels_fts WHERE rowid = old.id;
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS channels_fts_update AFTER UPDATE OF name, attributes ON channels BEGIN
+            DELETE FROM channels_fts WHERE rowid = old.id;
+            {insert_new}
+        END
+    """)
+
+    # Index the channels that already exist
+    row_values = ", ".join(["name"] + [_json_attribute("channels", key) for key in FTS_ATTRIBUTES])
+    conn.execute(f"""
+        INSERT INTO channels_fts (rowid, name, group_title, tvg_id, tvg_name, country)
+        SELECT id, {row_values} FROM channels
+    """)
+
+
+def _channel_checked_at(conn):
+    """ Adds the time of the last tuning check of each channel. """
+    conn.execute("ALTER TABLE channels ADD COLUMN checked_at REAL")
+
+
+def _playlist_sources(conn):
+    """ Adds the playlist sources table and the source of each channel. """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sources (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            url TEXT NOT NULL UNIQUE,
+            name TEXT,
+            last_synced_at REAL,
+            channel_count INTEGER DEFAULT 0
+        )
+    """)
+    conn.execute("ALTER TABLE channels ADD COLUMN source_id INTEGER REFERENCES sources (id) ON DELETE SET NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_channels_source ON channels (source_id)")
+
+
+def _probe_history(conn):
+    """ Adds the probe history of each channel and its precomputed health summary. """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS probe_history (
+            channel_id INTEGER NOT NULL REFERENCES channels (id) ON DELETE CASCADE,
+            probed_at REAL NOT NULL,
+            ok BOOLEAN NOT NULL,
+            status INTEGER,
+            latency_ms REAL,
+            bytes_read INTEGER,
+            PRIMARY KEY (channel_id, probed_at)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS channel_health (
+            channel_id INTEGER PRIMARY KEY REFERENCES channels (id) ON DELETE CASCADE,
+            probes INTEGER NOT NULL DEFAULT 0,
+            successes INTEGER NOT NULL DEFAULT 0,
+            consecutive_failures INTEGER NOT NULL DEFAULT 0,
+            health_score REAL,
+            latency_p50 REAL,
+            latency_p95 REAL,
+            last_probe_at REAL,
+            last_success_at REAL
+        )
+    """)
+
+
+# EXTINF attributes copied to their own indexed column when a channel is written, as (attribute, column).
+# The full attributes stay in the JSON 'attributes' column.
+TYPED_ATTRIBUTES = (
+    ("tvg-id", "tvg_id"),
+    ("tvg-name", "tvg_name"),
+    ("tvg-logo", "tvg_logo"),
+    ("group-title", "group_title"),
+    ("tvg-country", "country"),
+    ("tvg-language", "language"),
+)
+
+
+def _typed_attribute_columns(conn):
+    """ Adds indexed columns for the EXTINF attributes used by grouping and EPG queries. """
+    for _, column in TYPED_ATTRIBUTES:
+        conn.execute(f"ALTER TABLE channels ADD COLUMN {column} TEXT")
+
+    # Extract the attributes of the channels that already exist (empty values are stored as NULL)
+    assignments = ", ".join(
+        f"{column} = NULLIF({_json_attribute('channels', attribute)}, '')" for attribute, column in TYPED_ATTRIBUTES
+    )
+    conn.execute(f"UPDATE channels SET {assignments} WHERE attributes IS NOT NULL")
+
+    # Groups of the playlist, and the channels of a group ordered by name
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_channels_group ON channels (group_title, tuned, name)")
+    # EPG matching, most channels of a playlist usually have no tvg-id/tvg-name
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_channels_tvg_id ON channels (tvg_id) WHERE tvg_id IS NOT NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_channels_tvg_name ON channels (tvg_name) WHERE tvg_name IS NOT NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_channels_country ON channels (country) WHERE country IS NOT NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_channels_language ON channels (language) WHERE language IS NOT NULL")
+
+
+def _canonical_urls(conn):
+    """ Adds the canonical URL of each channel, dropping the channels whose canonical URL is repeated. """
+    conn.execute("ALTER TABLE channels ADD COLUMN canonical_url TEXT")
+
+    conn.create_function("canonical_url", 1, canonical_url, deterministic=True)
+    conn.execute("UPDATE channels SET canonical_url = canonical_url(url)")
+
+    # Trivially different URLs of the same stream: keep the favorite channel, otherwise the last watched one,
+    # otherwise the oldest one
+    conn.execute("""
+        DELETE FROM channels
+        WHERE id NOT IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY canonical_url ORDER BY favorite DESC, last DESC, id
+                ) AS position
+                FROM channels
+            )
+            WHERE position = 1
+        )
+    """)
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_channels_canonical_url ON channels (canonical_url)")
+
+
+def _import_checkpoints(conn):
+    """ Adds the checkpoints of the imports in progress, to resume them after an interruption. """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS import_checkpoints (
+            source TEXT PRIMARY KEY,
+            byte_offset INTEGER NOT NULL,
+            entry_index INTEGER NOT NULL,
+            content_hash TEXT NOT NULL,
+            updated_at REAL
+        )
+    """)
+
+
+def _channel_views(conn):
+    """ Adds how often and when each channel was watched, used to prioritize the background tuning. """
+    conn.execute("ALTER TABLE channels ADD COLUMN view_count INTEGER NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE channels ADD COLUMN last_viewed_at REAL")
+
+
+def _probe_latency_breakdown(conn):
+    """ Adds the parts of the probe latency spent resolving the host and opening connections. """
+    conn.execute("ALTER TABLE probe_history ADD COLUMN dns_ms REAL")
+    conn.execute("ALTER TABLE probe_history ADD COLUMN connect_ms REAL")
+
+
+# Ordered list of (version, migration). The database 'user_version' records the last one applied.
+# Never edit or reorder an existing entry: append a new one instead.
+MIGRATIONS = [
+    (1, _create_channels_table),
+    (2, _unique_channel_urls),
+    (3, _channel_query_indexes),
+    (4, _channels_full_text_search),
+    (5, _channel_checked_at),
+    (6, _playlist_sources),
+    (7, _probe_history),
+    (8, _typed_attribute_columns),
+    (9, _canonical_urls),
+    (10, _import_checkpoints),
+    (11, _channel_views),
+    (12, _probe_latency_breakdown),
+]
+
+
+def get_schema_version(conn):
+    """ Returns the schema version stored in the database. """
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def analyze(conn):
+    """
+    Refreshes the planner statistics of the regular tables.
+    The FTS5 shadow tables are skipped: statistics taken while they are small make FTS5's
+    own lookups fall back to scans, and inserts get slower as the index grows.
+    """
+    tables = conn.execute("""
+        SELECT name FROM sqlite_master
+        WHERE type = 'table' AND name NOT LIKE 'sqlite_%' AND name NOT LIKE '%_fts%'
+    """).fetchall()
+
+    for (table,) in tables:
+        conn.execute(f'ANALYZE "{table}"')
+
+    # Drop statistics gathered on the FTS5 tables by earlier versions
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+        conn.execute("DELETE FROM sqlite_stat1 WHERE tbl LIKE '%_fts%'")
+
+
+def migrate(conn):
+    """
+    Upgrades the database schema in place by applying every pending migration.
+    Each migration runs in its own transaction together with the version bump.
+
+    :param conn: A connection in autocommit mode (isolation_level=None).
+    :return: The schema version after the upgrade.
+    """
+    current_version = get_schema_version(conn)
+    pending = [(version, migration) for version, migration in MIGRATIONS if version > current_version]
+
+    if not pending:
+        return current_version
+
+    for version, migration in pending:
+        logger.info(f"Applying database migration {version}: {migration.__doc__.strip()}")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+        except Exception:
+            conn.execute("ROLLBACK")
+            logger.error(f"Database migration {version} failed, schema left at version {current_version}")
+            raise
+        conn.execute("COMMIT")
+        current_version = version
+
+    # Refresh the planner statistics so the new indexes are picked up
+    analyze(conn)
+
+    return current_version
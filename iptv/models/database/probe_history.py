@@ -0,0 +1,233 @@
+import math
+
+from .channel import Channel
+from .connection import database_lock, get_connection
+from ...config.settings import get_database_path
+
+# Number of most recent probes kept per channel
+HISTORY_WINDOW = 20
+
+# Weight of each probe relative to the next more recent one in the health score
+HEALTH_DECAY = 0.8
+
+# Channels whose health score falls below this threshold are considered not tuned
+HEALTH_THRESHOLD = 0.5
+
+# Maximum number of channel IDs per "IN (...)" query (SQLite limits the number of variables)
+_CHUNK_SIZE = 500
+
+
+def _percentile(sorted_values, fraction):
+    """ Nearest-rank percentile of an already sorted list, or None if it is empty. """
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class ChannelHealth:
+    __slots__ = (
+        "channel_id", "probes", "successes", "consecutive_failures", "health_score",
+        "latency_p50", "latency_p95", "last_probe_at", "last_success_at"
+    )
+
+    def __init__(self, channel_id, probes, successes, consecutive_failures, health_score,
+                 latency_p50, latency_p95, last_probe_at, last_success_at):
+        """
+        Health summary of a channel, computed over its last HISTORY_WINDOW probes:
+        - health_score (float): Success ratio between 0 and 1, recent probes weighing more.
+        - latency_p50 / latency_p95 (float): Latency percentiles of the successful probes, in milliseconds.
+        - consecutive_failures (int): Failed probes since the last successful one.
+        """
+        self.channel_id = channel_id
+        self.probes = probes
+        self.successes = successes
+        self.consecutive_failures = consecutive_failures
+        self.health_score = health_score
+        self.latency_p50 = latency_p50
+        self.latency_p95 = latency_p95
+        self.last_probe_at = last_probe_at
+        self.last_success_at = last_success_at
+
+    def __repr__(self):
+        return f"<ChannelHealth(channel_id={self.channel_id}, score={self.health_score}, p50={self.latency_p50})>"
+
+    @property
+    def is_healthy(self):
+        """ Whether the channel should be shown as tuned. """
+        return self.health_score is not None and self.health_score >= HEALTH_THRESHOLD
+
+    @staticmethod
+    def from_history(channel_id, history):
+        """
+        Computes the health summary of a channel.
+        :param history: List of (probed_at, ok, latency_ms) tuples, the most recent first.
+        """
+        weight = 1.0
+        weighted_successes = total_weight = 0.0
+        consecutive_failures = 0
+        counting_failures = True
+        latencies = []
+        last_success_at = None
+
+        for probed_at, ok, latency_ms in history:
+            total_weight += weight
+            if ok:
+                weighted_successes += weight
+                counting_failures = False
+                if last_success_at is None:
+                    last_success_at = probed_at
+                if latency_ms is not None:
+                    latencies.append(latency_ms)
+            elif counting_failures:
+                consecutive_failures += 1
+            weight *= HEALTH_DECAY
+
+        latencies.sort()
+
+        return ChannelHealth(
+            channel_id=channel_id,
+            probes=len(history),
+            successes=sum(1 for _, ok, _ in history if ok),
+            consecutive_failures=consecutive_failures,
+            health_score=weighted_successes / total_weight if total_weight else None,
+            latency_p50=_percentile(latencies, 0.5),
+            latency_p95=_percentile(latencies, 0.95),
+            last_probe_at=history[0][0] if history else None,
+            last_success_at=last_success_at
+        )
+
+
+class ProbeHistory:
+    @staticmethod
+    def record_bulk(probes):
+        """
+        Stores many probe results in a single transaction, prunes the history of the probed
+        channels to the last HISTORY_WINDOW probes and refreshes their health summary.
+
+        :param probes: Iterable of (channel_id, probed_at, ok, status, latency_ms, bytes_read, dns_ms, connect_ms)
+                       tuples, 'dns_ms' and 'connect_ms' being None when not measured.
+        :return: A dictionary {channel_id: ChannelHealth} for the probed channels that still exist.
+        """
+        rows = [
+            (channel_id, probed_at, int(bool(ok)), status, latency_ms, bytes_read, dns_ms, connect_ms)
+            for channel_id, probed_at, ok, status, latency_ms, bytes_read, dns_ms, connect_ms in probes
+        ]
+        if not rows:
+            return {}
+
+        channel_ids = list({row[0] for row in rows})
+
+        with Channel.transaction() as conn:
+            # Probes of channels deleted in the meantime are dropped
+            conn.executemany("""
+                INSERT OR REPLACE INTO probe_history (
+                    channel_id, probed_at, ok, status, latency_ms, bytes_read, dns_ms, connect_ms
+                )
+                SELECT ?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8 WHERE EXISTS (SELECT 1 FROM channels WHERE id = ?1)
+            """, rows)
+
+            # Drop everything older than the last HISTORY_WINDOW probes of each channel
+            conn.executemany("""
+                DELETE FROM probe_history
+                WHERE channel_id = ?1 AND probed_at < (
+                    SELECT probed_at FROM probe_history
+                    WHERE channel_id = ?1
+                    ORDER BY probed_at DESC
+                    LIMIT 1 OFFSET ?2
+                )
+            """, [(channel_id, HISTORY_WINDOW - 1) for channel_id in channel_ids])
+
+            histories = {channel_id: [] for channel_id in channel_ids}
+            for i in range(0, len(channel_ids), _CHUNK_SIZE):
+                chunk = channel_ids[i:i + _CHUNK_SIZE]
+                placeholders = ", ".join(["?"] * len(chunk))
+                cursor = conn.execute(f"""
+                    SELECT channel_id, probed_at, ok, latency_ms FROM probe_history
+                    WHERE channel_id IN ({placeholders})
+                    ORDER BY channel_id, probed_at DESC
+                """, chunk)
+                for channel_id, probed_at, ok, latency_ms in cursor:
+                    histories[channel_id].append((probed_at, bool(ok), latency_ms))
+
+            health = {
+                channel_id: ChannelHealth.from_history(channel_id, history)
+                for channel_id, history in histories.items()
+                if history
+            }
+
+            conn.executemany("""
+                INSERT OR REPLACE INTO channel_health (
+                    channel_id, probes, successes, consecutive_failures, health_score,
+                    latency_p50, latency_p95, last_probe_at, last_success_at
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [tuple(getattr(item, field) for field in ChannelHealth.__slots__) for item in health.values()])
+
+        return health
+
+    @staticmethod
+    def get_history(channel_id):
+        """ Retrieves the stored probes of a channel, the most recent first. """
+        sql_query = """
+            SELECT probed_at, ok, status, latency_ms, bytes_read, dns_ms, connect_ms FROM probe_history
+            WHERE channel_id = ?
+            ORDER BY probed_at DESC
+        """
+        return Channel._execute_query(sql_query, (channel_id,), fetch=True)
+
+    @staticmethod
+    def get_health(channel_id):
+        """ Retrieves the precomputed health summary of a channel, or None if it was never probed. """
+        sql_query = f"SELECT {', '.join(ChannelHealth.__slots__)} FROM channel_health WHERE channel_id = ?"
+        row = Channel._execute_query(sql_query, (channel_id,), fetch=True)
+
+        if row:
+            return ChannelHealth(*row[0])
+        return None
+
+    @staticmethod
+    def get_summary():
+        """
+        Summarizes the health of the probed channels.
+        :return: A dictionary with 'probed' (channels with a health summary), 'healthy', the average
+                 'health_score', the median of the channels 'latency_p50', 'last_probe_at', and the
+                 average 'dns_ms' and 'connect_ms' of the stored successful probes that measured them.
+        """
+        row = Channel._execute_query(f"""
+            SELECT COUNT(*), COALESCE(SUM(health_score >= {HEALTH_THRESHOLD}), 0), AVG(health_score), MAX(last_probe_at)
+            FROM channel_health
+        """, fetch=True)[0]
+        breakdown = Channel._execute_query(
+            "SELECT AVG(dns_ms), AVG(connect_ms) FROM probe_history WHERE ok AND dns_ms IS NOT NULL", fetch=True
+        )[0]
+        latencies = [latency for (latency,) in Channel._execute_query(
+            "SELECT latency_p50 FROM channel_health WHERE latency_p50 IS NOT NULL ORDER BY latency_p50", fetch=True
+        )]
+
+        return {
+            "probed": row[0],
+            "healthy": row[1],
+            "health_score": row[2],
+            "latency_p50": _percentile(latencies, 0.5),
+            "last_probe_at": row[3],
+            "dns_ms": breakdown[0],
+            "connect_ms": breakdown[1],
+        }
+
+    @staticmethod
+    def iter_tuning_candidates():
+        """
+        Generator yielding what the tuning scheduler needs to know about every channel:
+        (channel_id, url, checked_at, favorite, view_count, last_viewed_at, consecutive_failures) tuples.
+        The rows are streamed from the database rather than loaded at once.
+        """
+        database_path = get_database_path()
+        with database_lock(database_path):
+            cursor = get_connection(database_path).execute("""
+                SELECT c.id, c.url, c.checked_at, c.favorite, c.view_count, c.last_viewed_at,
+                       COALESCE(h.consecutive_failures, 0)
+                FROM channels c
+                LEFT JOIN channel_health h ON h.channel_id = c.id
+            """)
+            yield from cursor
@@ -0,0 +1,191 @@
+import time
+from itertools import islice
+
+from .channel import INSERT_COLUMNS, Channel
+from .connection import get_connection
+from ...config.logger import logger
+from ...config.settings import get_database_path
+
+
+class Source:
+    __slots__ = ("id", "url", "name", "last_synced_at", "channel_count")
+
+    def __init__(self, id, url, name=None, last_synced_at=None, channel_count=0):
+        """
+        A playlist the channels were imported from:
+        - id (int): Unique identifier for the source (automatically generated by the database).
+        - url (str): URL or path of the playlist.
+        - name (str): Optional display name.
+        - last_synced_at (float): UNIX timestamp of the last resync.
+        - channel_count (int): Number of entries in the playlist at the last resync.
+        """
+        self.id = id
+        self.url = url
+        self.name = name
+        self.last_synced_at = last_synced_at
+        self.channel_count = channel_count
+
+    def __repr__(self):
+        return f"<Source(id={self.id}, url={self.url}, channels={self.channel_count})>"
+
+    @staticmethod
+    def get_source_by_url(source_url):
+        """ Retrieves a source by its URL. """
+        sql_query = "SELECT id, url, name, last_synced_at, channel_count FROM sources WHERE url=?"
+        row = Channel._execute_query(sql_query, (source_url,), fetch=True)
+
+        if row:
+            return Source(*row[0])
+        return None
+
+    @staticmethod
+    def get_all_sources():
+        """ Retrieves all the sources. """
+        sql_query = "SELECT id, url, name, last_synced_at, channel_count FROM sources ORDER BY id"
+        rows = Channel._execute_query(sql_query, fetch=True)
+
+        return [Source(*row) for row in rows]
+
+    @staticmethod
+    def get_or_create(source_url, name=None):
+        """ Returns the ID of the source with the given URL, creating it if needed. """
+        with Channel.transaction() as conn:
+            row = conn.execute("SELECT id FROM sources WHERE url=?", (source_url,)).fetchone()
+            if row:
+                return row[0]
+            return conn.execute("INSERT INTO sources (url, name) VALUES (?, ?)", (source_url, name)).lastrowid
+
+    @staticmethod
+    def delete_source(source_url):
+        """ Deletes a source together with all the channels imported from it. """
+        with Channel.transaction():
+            source = Source.get_source_by_url(source_url)
+            if source:
+                Channel._execute_query("DELETE FROM channels WHERE source_id=?", (source.id,))
+                Channel._execute_query("DELETE FROM sources WHERE id=?", (source.id,))
+
+    @staticmethod
+    def resync(source_url, channels, batch_size=1000, progress_callback=None):
+        """
+        Synchronizes the channels of a source with a freshly parsed playlist.
+        The playlist is staged in a temporary table and compared with the stored rows in SQL, so only
+        the differences are written, in a single transaction (see StagedResync):
+        - entries whose URL is not stored yet are inserted (URLs are compared in their canonical form),
+        - stored channels whose URL, name, duration, attributes or extras changed are updated
+          (channels stored without a source are attached to this one),
+        - channels of the source missing from the playlist are deleted.
+
+        Channels already owned by another source are left untouched. An empty playlist raises a
+        ValueError without changing anything.
+
+        :param source_url: URL or path of the playlist.
+        :param channels: Iterable of channel dictionaries or objects, consumed 'batch_size' at a time.
+        :param progress_callback: Optional callable receiving the number of entries staged so far.
+        :return: A dictionary with the 'inserted', 'updated', 'deleted' and 'total' counts.
+        """
+        rows = filter(None, map(Channel.to_insert_row, channels))
+        return Source.resync_rows(source_url, rows, batch_size, progress_callback)
+
+    @staticmethod
+    def resync_rows(source_url, rows, batch_size=1000, progress_callback=None):
+        """ Same as resync() for rows already built by Channel.to_insert_row(). """
+        rows = iter(rows)
+        staging = StagedResync(source_url)
+        try:
+            while batch := list(islice(rows, batch_size)):
+                staging.stage(batch)
+                if progress_callback:
+                    progress_callback(staging.staged)
+
+            return staging.apply()
+        finally:
+            staging.discard()
+
+
+class StagedResync:
+    """
+    Resync of a source in two steps (see Source.resync):
+    - stage(): the rows of the playlist are stored in a temporary table as they arrive, which doesn't
+      lock the database, so a slow download never blocks the other writers;
+    - apply(): the differences with the stored channels are written in a single short transaction.
+    """
+
+    def __init__(self, source_url, table="sync_entries"):
+        """
+        :param source_url: URL or path of the playlist.
+        :param table: Name of the temporary table, several resyncs can be staged at once with different names.
+        """
+        self.source_url = source_url
+        self.table = f"temp.{table}"
+        self.staged = 0  # Rows staged so far (repeated URLs included)
+
+        # Entries are matched with the stored channels by canonical URL
+        self._data_columns = [column for column in INSERT_COLUMNS if column != "canonical_url"]
+        self._conn = get_connection(get_database_path())
+        self._conn.execute(f"DROP TABLE IF EXISTS {self.table}")
+        self._conn.execute(
+            f"CREATE TEMP TABLE {table} (canonical_url TEXT PRIMARY KEY, {', '.join(self._data_columns)})"
+        )
+
+    def stage(self, rows):
+        """ Adds rows built by Channel.to_insert_row() (the first entry wins when a canonical URL is repeated). """
+        rows = list(rows)
+        self._conn.executemany(f"""
+            INSERT OR IGNORE INTO {self.table} ({", ".join(INSERT_COLUMNS)})
+            VALUES ({", ".join(["?"] * len(INSERT_COLUMNS))})
+        """, rows)
+        self.staged += len(rows)
+
+    def apply(self):
+        """
+        Writes the differences between the staged playlist and the stored channels of the source.
+        An empty playlist raises a ValueError without changing anything.
+
+        :return: A dictionary with the 'inserted', 'updated', 'deleted' and 'total' counts.
+        """
+        columns = ", ".join(INSERT_COLUMNS)
+        data_columns = self._data_columns
+
+        with Channel.transaction() as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+            if total == 0:
+                # Most likely a broken download: never wipe the source because of it
+                raise ValueError("The playlist has no channels, the source was left unchanged.")
+
+            source_id = Source.get_or_create(self.source_url)
+
+            deleted = conn.execute(f"""
+                DELETE FROM channels
+                WHERE source_id = ? AND canonical_url NOT IN (SELECT canonical_url FROM {self.table})
+            """, (source_id,)).rowcount
+
+            updated = conn.execute(f"""
+                UPDATE channels
+                SET {", ".join(f"{column} = s.{column}" for column in data_columns)}, source_id = ?
+                FROM {self.table} AS s
+                WHERE channels.canonical_url = s.canonical_url
+                  AND (channels.source_id = ? OR channels.source_id IS NULL)
+                  AND (channels.source_id IS NULL
+                       OR {" OR ".join(f"channels.{column} IS NOT s.{column}" for column in data_columns)})
+            """, (source_id, source_id)).rowcount
+
+            inserted = conn.execute(f"""
+                INSERT OR IGNORE INTO channels ({columns}, source_id)
+                SELECT {columns}, ? FROM {self.table}
+            """, (source_id,)).rowcount
+
+            conn.execute(
+                "UPDATE sources SET last_synced_at = ?, channel_count = ? WHERE id = ?",
+                (time.time(), total, source_id)
+            )
+
+        logger.info(
+            f"Resynced source {self.source_url}: {inserted} inserted, {updated} updated, {deleted} deleted "
+            f"({total} entries)"
+        )
+
+        return {"inserted": inserted, "updated": updated, "deleted": deleted, "total": total}
+
+    def discard(self):
+        """ Drops the staged rows. """
+        self._conn.execute(f"DROP TABLE IF EXISTS {self.table}")
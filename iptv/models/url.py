@@ -0,0 +1,78 @@
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Ports dropped from the canonical form of the URLs of these schemes
+DEFAULT_PORTS = {
+    "http": 80,
+    "https": 443,
+    "rtmp": 1935,
+    "rtsp": 554,
+}
+
+# Query parameters that only track where a link was clicked, they never select a different stream
+TRACKING_PARAMETERS = {"fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "igshid", "yclid"}
+TRACKING_PREFIXES = ("utm_",)
+
+
+def _is_tracking_parameter(name):
+    """ Whether a query parameter is a tracking one. """
+    name = name.lower()
+    return name in TRACKING_PARAMETERS or name.startswith(TRACKING_PREFIXES)
+
+
+def canonical_url(url):
+    """
+    Returns the canonical form of a stream URL, used to detect trivially different URLs of the same stream:
+    - the scheme and host are lowercased and the default port of the scheme is dropped,
+    - an empty path becomes '/' and the trailing slash of other paths is dropped,
+    - tracking query parameters (utm_*, fbclid, ...) are dropped and the others sorted,
+    - the fragment is dropped.
+
+    Only used as a deduplication key: the URL of a channel is always stored and played as found in the playlist.
+    URLs that cannot be parsed are returned stripped but otherwise unchanged.
+    """
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+
+    scheme = parts.scheme.lower()
+    if not parts.netloc:
+        # Not a hierarchical URL (e.g. a local path), nothing to normalize but the scheme
+        return urlunsplit((scheme, "", parts.path, parts.query, ""))
+
+    host = (parts.hostname or "").lower()
+    if ":" in host:
+        host = f"[{host}]"  # IPv6 address
+    if port is not None and port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{port}"
+
+    # User info (credentials) is case-sensitive and kept as it is
+    netloc = parts.netloc.rpartition("@")[0]
+    netloc = f"{netloc}@{host}" if netloc else host
+
+    path = parts.path or "/"
+    if len(path) > 1:
+        path = path.rstrip("/") or "/"
+
+    query = parts.query
+    if query:
+        parameters = [
+            (name, value) for name, value in parse_qsl(query, keep_blank_values=True)
+            if not _is_tracking_parameter(name)
+        ]
+        query = urlencode(sorted(parameters))
+
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+def url_host(url):
+    """
+    Returns the lowercased host of a URL, the key of the per-host limits of the tuning.
+    URLs without a host (local paths) or that cannot be parsed return an empty string.
+    """
+    try:
+        return (urlsplit(url.strip()).hostname or "").lower()
+    except ValueError:
+        return ""
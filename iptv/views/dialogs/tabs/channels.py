@@ -17,7 +17,6 @@ from iptv.controllers.thread.channel_tuning import ChannelTuningThread
 from iptv.controllers.thread.file_loader import FileLoaderThread
 from iptv.controllers.thread.url_loader import URLLoaderThread
 from iptv.event_bus import event_bus
-from iptv.models.database.channel import Channel
 
 
 class ChannelTab(QWidget):
@@ -146,9 +145,8 @@ class ChannelTab(QWidget):
             """)
         self.message_label.setVisible(True)
 
-        # Create and start the tuning thread
-        channels = Channel.get_all_channels_without_filters()
-        self.tuning_thread = ChannelTuningThread(channels)
+        # Create and start the tuning thread (it streams the channels from the database)
+        self.tuning_thread = ChannelTuningThread()
 
         # Connect signals for progress updates and when finished
         self.tuning_thread.progress_updated.connect(self.update_progress)
@@ -195,7 +193,7 @@ class ChannelTab(QWidget):
             self,
             "Select M3U/M3U8 File",
             "",
-            "Playlist Files (*.m3u *.m3u8);;All Files (*)"
+            "Playlist Files (*.m3u *.m3u8 *.m3u.gz *.m3u8.gz *.m3u.xz *.m3u8.xz *.m3u.bz2 *.m3u8.bz2);;All Files (*)"
         )
 
         if not file_path:
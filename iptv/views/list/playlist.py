@@ -5,12 +5,17 @@ from PyQt6.QtWidgets import (
     QVBoxLayout,
     QListView,
     QAbstractItemView,
-    QLabel
+    QLabel,
+    QLineEdit
 )
 
 from iptv.config.logger import logger
 from iptv.event_bus import event_bus
 from iptv.models.channel_manager import ChannelManager
+from iptv.models.database.channel import Channel
+
+# Maximum number of channels shown for a search
+SEARCH_LIMIT = 500
 
 
 class Playlist(QWidget):
@@ -26,6 +31,13 @@ class Playlist(QWidget):
         self.channel_count_label = QLabel("Channels count: 0", self)
         layout.addWidget(self.channel_count_label)
 
+        # Search field to filter the channels by name, group, tvg-id or country
+        self.search_input = QLineEdit(self)
+        self.search_input.setPlaceholderText("Search channels...")
+        self.search_input.setClearButtonEnabled(True)
+        self.search_input.textChanged.connect(self.on_search_changed)
+        layout.addWidget(self.search_input)
+
         # Create the list view and model
         self.playlist = QListView(self)
         self.playlist.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
@@ -50,14 +62,18 @@ class Playlist(QWidget):
 
     def load_channels(self):
         """ Load channels from the ChannelManager and update the playlist """
-        # Clear the model
-        self.playlist_model.clear()
-
         # Get channels from the ChannelManager
         channels = ChannelManager.get_instance().channels
 
         logger.info(f"Channels Playlist: {len(channels)}")
 
+        self.show_channels(channels)
+
+    def show_channels(self, channels):
+        """ Replace the content of the playlist with the given channels """
+        # Clear the model
+        self.playlist_model.clear()
+
         # Update the label with the count of channels
         self.update_channel_count_label(len(channels))
 
@@ -67,6 +83,14 @@ class Playlist(QWidget):
             item.setData(channel.url, Qt.ItemDataRole.UserRole)  # Store the URL as additional data
             self.playlist_model.appendRow(item)
 
+    def on_search_changed(self, text):
+        """ Show the channels matching the search text, or every channel when it is empty """
+        if not text.strip():
+            self.load_channels()
+            return
+
+        self.show_channels(Channel.search(text, limit=SEARCH_LIMIT, tuned=True))
+
     def update_channel_count_label(self, count):
         """ Update the label to display the count of channels """
         self.channel_count_label.setText(f"Channels count: {count}")
@@ -83,4 +107,4 @@ class Playlist(QWidget):
         """ Handle the channels_updated signal from the EventBus """
         logger.info("Channels updated signal received.")
         ChannelManager.get_instance().refresh()
-        self.load_channels()
+        self.on_search_changed(self.search_input.text())